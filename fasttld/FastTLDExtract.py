@@ -8,17 +8,29 @@
 Copyright (c) 2022 Wu Tingfeng
 Copyright (c) 2017-2018 Jophy
 """
+import os
+import sys
 from collections import namedtuple
+from mmap import ACCESS_READ, mmap
 from re import compile
 from socket import AF_INET6, inet_pton
+from threading import Lock
+from time import perf_counter_ns
 
-from fasttld.psl import getPublicSuffixList, update
+from fasttld.instrument import (Metrics, RuleHits, SlowCallHook, StageProfile, profiled_copy,
+                                prometheus_text, run_profiled, stage_durations, stage_helper,
+                                trie_memory_report)
+from fasttld.psl import DEFAULT_FILE_PATH, MIN_RULES, getPublicSuffixRules, punycode, update
+from fasttld.watch import FileWatcher
 
 # from idna import decode
 
 labelSeparators = "\u002e\u3002\uff0e\uff61"
 labelSeparatorsSet = set(labelSeparators)
 whitespace = " \t\n\v\f\r\uFEFF\u200b\u200c\u200d\u00a0\u1680\u0085\u0000"
+asciiWhitespaceSet = set(ord(i) for i in whitespace if ord(i) < 128)
+# First or last bytes of a line that strip_whitespace_bytes may have to remove
+lineEdgeStripSet = asciiWhitespaceSet | set(range(128, 256))
 endOfHostWithPortDelimiters = "/\\?#"
 endOfHostWithPortDelimitersSet = set(ord(i) for i in endOfHostWithPortDelimiters)
 endOfHostDelimitersSet = set(ord(i) for i in (endOfHostWithPortDelimiters + ":"))
@@ -35,6 +47,18 @@ IP_RE = compile(
 )
 
 SPLIT_RE = compile("(\\%s)" % "|".join(labelSeparators))
+split_labels = SPLIT_RE.split
+
+# Key of the set of child keys that only private section rules lead to, in the nodes of a trie
+# built with private suffixes. Labels never contain ".", so it cannot match a label.
+PRIVATE_KEY = "_PRIVATE."
+NO_PRIVATE_KEYS = frozenset()
+
+# Serialises add_rules() and remove_rules(), which copy the trie root and swap it in
+_rules_lock = Lock()
+
+EXCLUDED_PRIVATE_SUFFIX_ERROR = ("include_private=True requires a FastTLDExtract constructed "
+                                 "with exclude_private_suffix=False")
 
 TLDResult = namedtuple(
     "TLDResult",
@@ -49,6 +73,97 @@ TLDResult = namedtuple(
         "domain_name",
     ],
 )
+# Result of a URL from which no host could be extracted
+EMPTY_RESULT = TLDResult("", "", "", "", "", "", "", "")
+
+
+class LazyTrie(dict):
+    """
+    Trie root that builds the sub-trie of a TLD the first time a lookup asks for it.
+    Until then the rules of the TLD are kept in pending as one interned string, of newline
+    separated ICANN section rules followed by a tab and the private section rules, if any.
+    The string of a TLD whose only rule is itself is the TLD key itself.
+    """
+
+    def __init__(self, pending, build):
+        """
+        :param pending: dict of TLD to rules string.
+        :param build: Function building the sub-trie of a TLD from (rule, private) items.
+        """
+        dict.__init__(self)
+        self.pending = pending
+        self.build = build
+        # Serialises building TLDs against each other and against copy() and snapshot()
+        self.lock = Lock()
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or self.materialise(key)
+
+    def materialise(self, tld):
+        """
+        Build the sub-trie of a pending TLD into the root.
+        :return: Whether the TLD is now in the root.
+        """
+        if tld in self.pending:
+            with self.lock:
+                # Another thread may have built it while this one waited
+                text = self.pending.get(tld)
+                if text is not None:
+                    sub_trie = self.build(self.parse_rules(text))
+                    if tld in sub_trie:
+                        self.setdefault(sys.intern(tld), sub_trie[tld])
+                    del self.pending[tld]
+        return dict.__contains__(self, tld)
+
+    @staticmethod
+    def parse_rules(text):
+        """:return: List of (rule, private) of a pending rules string"""
+        icann, _, private = text.partition("\t")
+        return ([(rule, False) for rule in icann.split("\n") if rule]
+                + [(rule, True) for rule in private.split("\n") if rule])
+
+    def rules(self, tld):
+        """:return: List of (rule, private) of a pending TLD"""
+        return self.parse_rules(self.pending[tld])
+
+    def set_rules(self, tld, rules):
+        """
+        Replace the pending rules of a TLD, or drop the TLD if rules is empty.
+        Only for a trie that lookups cannot reach yet, see FastTLDExtract._apply_rules().
+        """
+        if not rules:
+            self.pending.pop(tld, None)
+            return
+        text = "\n".join(rule for rule, private in rules if not private)
+        if any(private for _, private in rules):
+            text += "\t" + "\n".join(rule for rule, private in rules if private)
+        self.pending[sys.intern(tld)] = sys.intern(text)
+
+    def snapshot(self):
+        """:return: (built, pending), consistent copies of the root and of the pending rules"""
+        with self.lock:
+            return dict(self), dict(self.pending)
+
+    def copy(self):
+        built, pending = self.snapshot()
+        trie = LazyTrie(pending, self.build)
+        trie.update(built)
+        return trie
+
+    @staticmethod
+    def index_report(pending):
+        """
+        :param pending: Pending rules, from snapshot().
+        :return: dict(pending_tlds, index_bytes) of the pending rules, keys included
+        """
+        seen = set()
+        index_bytes = sys.getsizeof(pending)
+        for item in pending.items():
+            for text in item:
+                if id(text) not in seen:
+                    seen.add(id(text))
+                    index_bytes += sys.getsizeof(text)
+        return {"pending_tlds": len(pending), "index_bytes": index_bytes}
 
 
 def replace_multiple(s, chars, replace_with):
@@ -72,6 +187,11 @@ def looks_like_ip(maybe_ip):
     return IP_RE.match(str(maybe_ip, 'utf-8'))
 
 
+def encode_idna(host):
+    """Punycode form of a memoryview of a UTF-8 encoded host, as a memoryview"""
+    return memoryview(str(host, 'utf-8').encode('idna'))
+
+
 def check_numeric(maybe_numeric):
     try:
         int(maybe_numeric)
@@ -100,6 +220,27 @@ def index_any(s, charset):
     return -1
 
 
+def strip_ascii_whitespace(s):
+    """strip_ascii_whitespace returns s without leading and trailing ASCII whitespace
+    """
+    start, end = 0, len(s)
+    while start < end and s[start] in asciiWhitespaceSet:
+        start += 1
+    while end > start and s[end-1] in asciiWhitespaceSet:
+        end -= 1
+    return s[start:end]
+
+
+def strip_whitespace_bytes(s):
+    """strip_whitespace_bytes is str.strip(whitespace) for a memoryview of UTF-8 bytes
+    """
+    s = strip_ascii_whitespace(s)
+    if len(s) and (s[0] > 127 or s[-1] > 127):
+        # May begin or end with non-ASCII whitespace
+        s = memoryview(bytes(str(s, 'utf-8').strip(whitespace), 'utf-8'))
+    return s
+
+
 def getSchemeEndIndex(s):
     colon = False
     slashCount = 0
@@ -141,63 +282,636 @@ def getSchemeEndIndex(s):
 
 
 class FastTLDExtract(object):
-    def __init__(self, exclude_private_suffix=False, file_path=""):
-        self.trie = self._trie_construct(exclude_private_suffix, file_path)
+    def __init__(self, exclude_private_suffix=False, file_path="", tlds=None, rule_filter=None,
+                 lazy=False, data=None):
+        """
+        :param exclude_private_suffix: Compile only the ICANN section of the public suffix list.
+        :param file_path: Public suffix list to use instead of the bundled one.
+        :param tlds: Compile only the rules of these TLDs, eg. ["uk", "de"], as Unicode or
+        punycode. Other TLDs are treated like TLDs missing from the list, eg. example.zzz.
+        :param rule_filter: Compile only the rules for which rule_filter(rule, private) is true,
+        eg. lambda rule, private: private for the private section only.
+        Rules from add_rules() are compiled regardless of tlds and rule_filter.
+        :param lazy: Only index the rules by TLD, and build the sub-trie of a TLD the first time
+        a lookup reaches it, so that memory grows with the TLDs actually seen, see LazyTrie.
+        :param data: Contents of a public suffix list, as bytes or str, to compile instead of
+        file_path. reload() and update() still use file_path.
+        """
+        self._configure(exclude_private_suffix, file_path, tlds, rule_filter, lazy)
+        self.trie = self._trie_construct(exclude_private_suffix, file_path, data)
+
+    def _configure(self, exclude_private_suffix, file_path, tlds, rule_filter, lazy):
+        """Set up everything but the trie, see __init__()."""
+        self.exclude_private_suffix = exclude_private_suffix
+        self.file_path = file_path
+        self.tlds = None if tlds is None else self._expand_tlds(tlds)
+        self.rule_filter = rule_filter
+        self.lazy = lazy
+        # Rules from add_rules() and remove_rules(), kept across reload()
+        self._added_rules = {}
+        self._removed_rules = set()
+        self.trie_constructions = 0
+        self._profile = self._metrics = self._slow_call_hook = self._rule_hits = None
+        self._profiling = False
+        self._watcher = None
+
+    def clone(self, file_path=None):
+        """
+        A new instance with the same options and rules as this one, whose trie shares its nodes
+        with this one without building anything. Custom rules from add_rules() and
+        remove_rules(), instrumentation and watch() are not carried over.
+        :param file_path: Public suffix list file of the clone, for its reload() and update().
+        Defaults to the file_path of this instance.
+        :return: FastTLDExtract
+        """
+        clone = type(self).__new__(type(self))
+        clone._configure(self.exclude_private_suffix,
+                         self.file_path if file_path is None else file_path, self.tlds,
+                         self.rule_filter, self.lazy)
+        clone.trie = self.trie.copy()
+        return clone
+
+    def update(self, show_output=True, url=None, file_path=None, min_rules=MIN_RULES, timeout=60):
+        """
+        Download the latest public suffix list, see fasttld.psl.update(), then apply the rules
+        that changed to the trie, see reload(). Arguments are those of fasttld.psl.update().
+        :param file_path: File to update. Defaults to the file_path of this instance.
+        :return: dict from reload(), with nothing added, removed or rebuilt if the list was not
+        modified since the last download.
+        """
+        if file_path is None:
+            file_path = self.file_path
+        if not update(show_output, url, file_path, min_rules, timeout):
+            return {"added": [], "removed": [], "tlds": []}
+        if file_path == self.file_path:
+            return self.reload()
+        # Apply the list just downloaded rather than the one this instance was built from
+        with open(file_path or DEFAULT_FILE_PATH, "rb") as f:
+            return self.reload(f.read())
+
+    def reload(self, data=None, min_rules=0):
+        """
+        Re-read the public suffix list and apply only the rules that changed to the trie, as
+        add_rules() and remove_rules() do, instead of rebuilding it. Rules added or removed with
+        add_rules() and remove_rules() are kept.
+        :param data: Contents of a public suffix list, as bytes or str, instead of file_path.
+        :param min_rules: Leave the trie unchanged and raise if the list has fewer rules, e.g.
+        because it was read while being written.
+        :return: dict(added=[(rule, private), ...], removed=[rule, ...], tlds=[rebuilt TLDs]),
+        where added includes rules that moved between the ICANN and private sections.
+        """
+        rules = getPublicSuffixRules(self.file_path, data)
+        if len(rules) < min_rules:
+            raise Exception("The public suffix list has only %d rules, expected at least %d"
+                            % (len(rules), min_rules))
+        # Read the trie before the custom rules, so that an add_rules() or remove_rules() call
+        # from another thread in between is at worst applied again by this diff, not undone
+        trie, pending = self.trie, {}
+        if isinstance(trie, LazyTrie):
+            # Lookups may be building TLDs meanwhile
+            trie, pending = trie.snapshot()
+        target = dict(self._select_rules(rules, self.exclude_private_suffix))
+        target.update(self._added_rules)
+        for rule in self._removed_rules:
+            target.pop(rule, None)
+        current = {}
+        for tld in trie:
+            if tld != PRIVATE_KEY:
+                current.update(self._tld_rules(trie, tld))
+        for text in pending.values():
+            current.update(LazyTrie.parse_rules(text))
+        added = dict((rule, private) for rule, private in target.items()
+                     if current.get(rule) is not private)
+        removed = [rule for rule in current if rule not in target]
+        tlds = self._apply_rules(added, removed) if added or removed else []
+        return {"added": sorted(added.items()), "removed": sorted(removed), "tlds": tlds}
+
+    def watch(self, interval=5.0, callback=None, min_rules=MIN_RULES):
+        """
+        Start a daemon thread that polls the public suffix list file (file_path, else the
+        bundled list) every interval seconds, and reload()s it once its mtime, inode or size
+        has changed and then stayed the same for one more poll, so that a file being rewritten
+        in place is not read halfway. The trie is swapped in by reload(), so extract() is not
+        involved. Replaces any previous watcher. The watcher keeps this instance alive until
+        unwatch().
+        :param interval: Seconds between polls.
+        :param callback: Called from the watcher thread with the dict from reload().
+        :param min_rules: Ignore a list with fewer rules, see reload(). Lower it for small
+        custom lists.
+        :return: FileWatcher, whose error is the last reload() exception, if any.
+        """
+        self.unwatch()
+
+        def on_change():
+            diff = self.reload(min_rules=min_rules)
+            if callback is not None:
+                callback(diff)
+
+        self._watcher = FileWatcher(self.file_path or DEFAULT_FILE_PATH, on_change, interval)
+        return self._watcher
 
-    def update(self, *args, **kwargs):
-        update(*args, **kwargs)
+    def unwatch(self):
+        """Stop the watcher started by watch(), if any."""
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
 
     def nested_dict(self, dic, keys):
         """
         The idea of this function is based on https://stackoverflow.com/questions/13687924
+        A leaf that a longer rule passes through becomes a node with an "_END" marker,
+        and a rule ending on an existing node marks that node with "_END".
         :param dic:
         :param keys:
         :return:
         """
-        end = False
         for key in keys[:-1]:
-            dic_bk = dic
-            if key not in dic:
-                dic[key] = {}
-            dic = dic[key]
-            if isinstance(dic, bool):
-                end = True
-                dic = dic_bk
-                dic[keys[-2]] = {"_END": True, keys[-1]: True}
-        if not end:
+            child = dic.get(key)
+            if child is None:
+                child = dic[key] = {}
+            elif child is True:
+                child = dic[key] = {"_END": True}
+            dic = child
+        if isinstance(dic.get(keys[-1]), dict):
+            dic[keys[-1]]["_END"] = True
+        else:
             dic[keys[-1]] = True
 
-    def _trie_construct(self, exclude_private_suffix, file_path=""):
+    def nested_dict_private(self, dic, keys):
+        """
+        nested_dict() for a private section rule, once all ICANN section rules are in the trie.
+        The first key on its path that no ICANN section rule added ("_END" if the rule ends on an
+        existing node) is added to the PRIVATE_KEY set of its node, unless the path already goes
+        through a private key.
+        :param dic:
+        :param keys:
+        :return:
+        """
+        node = dic
+        for depth, key in enumerate(keys):
+            if node is True or key not in node:
+                break
+            if key in node.get(PRIVATE_KEY, NO_PRIVATE_KEYS):
+                self.nested_dict(dic, keys)
+                return
+            node = node[key]
+        else:
+            if node is not True and "_END" not in node:
+                node["_END"] = True
+                node.setdefault(PRIVATE_KEY, set()).add("_END")
+            return
+        self.nested_dict(dic, keys)
+        node = dic
+        for key in keys[:depth]:
+            node = node[key]
+        node.setdefault(PRIVATE_KEY, set()).add(keys[depth])
+
+    def _trie_construct(self, exclude_private_suffix, file_path="", data=None):
         """
         This function for building a trie structure based on Mozilla Public Suffix List.
         In order to construct this, all suffixes sorted in a reverse order.
         For example, www.google.com -> com.google.www
+        With private suffixes, keys that only private section rules lead to are listed in the
+        PRIVATE_KEY set of their node, so that one trie serves both views.
         :return: a trie dict
         """
+        rules = self._select_rules(getPublicSuffixRules(file_path, data), exclude_private_suffix)
+        if self.lazy:
+            return self._lazy_trie_construct(rules)
         tld_trie = {}
-        PublicSuffixList, PrivateSuffixList, AllSuffixList = getPublicSuffixList(file_path)
-        SuffixList = PublicSuffixList if exclude_private_suffix else AllSuffixList
-        for suffix in SuffixList:
+        if not exclude_private_suffix:
+            # ICANN section rules first, so that whatever private section rules add can be tagged
+            rules = [rule for rule in rules if not rule[1]] + [rule for rule in rules if rule[1]]
+        for suffix, private in rules:
+            # Intern labels so that keys repeated across the trie (com, co, ...) are shared
             if "." in suffix:
-                sp = suffix.split(".")
+                sp = [sys.intern(label) for label in suffix.split(".")]
                 sp.reverse()
-                self.nested_dict(tld_trie, sp)
-            else:
-                tld_trie[suffix] = {"_END": True}
+                if private:
+                    self.nested_dict_private(tld_trie, sp)
+                else:
+                    self.nested_dict(tld_trie, sp)
+            elif not private:
+                node = tld_trie.get(suffix)
+                if node is None:
+                    tld_trie[sys.intern(suffix)] = {"_END": True}
+                else:
+                    node["_END"] = True
+            elif suffix not in tld_trie:
+                tld_trie[sys.intern(suffix)] = {"_END": True}
+                tld_trie.setdefault(PRIVATE_KEY, set()).add(sys.intern(suffix))
         for key, val in tld_trie.items():
-            if len(val) == 1 and "_END" in val:
+            if key != PRIVATE_KEY and len(val) == 1 and "_END" in val:
                 tld_trie[key] = True
+        self.trie_constructions += 1
         return tld_trie
 
+    def _lazy_trie_construct(self, rules):
+        """
+        Index rules by TLD into a LazyTrie. The root PRIVATE_KEY set is filled in upfront,
+        since it only depends on whether a TLD has ICANN section rules.
+        :param rules: List of (rule, private)
+        :return: a LazyTrie
+        """
+        by_tld = {}
+        for rule in rules:
+            by_tld.setdefault(rule[0].rsplit(".", 1)[-1], []).append(rule)
+        tld_trie = LazyTrie({}, self._tld_trie)
+        private_tlds = set()
+        for tld, tld_rules in by_tld.items():
+            tld_trie.set_rules(tld, tld_rules)
+            if all(private for _, private in tld_rules):
+                private_tlds.add(sys.intern(tld))
+        if private_tlds:
+            tld_trie[PRIVATE_KEY] = private_tlds
+        self.trie_constructions += 1
+        return tld_trie
+
+    @staticmethod
+    def _expand_tlds(tlds):
+        """Normalise TLDs, adding the punycode form of IDN TLDs and the Unicode form of A-labels."""
+        expanded = set()
+        for tld in tlds:
+            tld = tld.strip().lstrip(".").lower()
+            expanded.add(tld)
+            if not tld.isascii():
+                expanded.add(punycode(tld))
+            elif tld.startswith("xn--"):
+                try:
+                    expanded.add(tld.encode("ascii").decode("idna"))
+                except UnicodeError:
+                    pass
+        return frozenset(expanded)
+
+    def _select_rules(self, rules, exclude_private_suffix):
+        """
+        Rules kept by exclude_private_suffix, tlds and rule_filter, in their original order.
+        :param rules: List of (rule, private) from getPublicSuffixRules().
+        :return: List of (rule, private)
+        """
+        if exclude_private_suffix:
+            rules = [rule for rule in rules if not rule[1]]
+        if self.tlds is not None:
+            tlds = self.tlds
+            rules = [rule for rule in rules if rule[0].rsplit(".", 1)[-1] in tlds]
+        if self.rule_filter is not None:
+            rule_filter = self.rule_filter
+            rules = [(rule, private) for rule, private in rules if rule_filter(rule, private)]
+        return rules
+
+    def add_rules(self, rules, private=False):
+        """
+        Add rules to the trie, eg. corp.example, *.svc.cluster.local or !www.svc.cluster.local,
+        with the same semantics as the rules of the public suffix list.
+        Only the sub-tries of the affected TLDs are rebuilt, in a copy of the trie root that is
+        then swapped in, so lookups already running finish on the previous trie.
+        :param rules: Iterable of rules. The punycode form of an IDN rule is added too.
+        :param private: Add the rules to the private section, see extract(include_private=...).
+        Private rules are ignored if private suffixes were excluded.
+        :return:
+        """
+        rules = self._expand_rules(rules)
+        for rule in rules:
+            self._added_rules[rule] = private
+            self._removed_rules.discard(rule)
+        self._apply_rules(dict((rule, private) for rule in rules), ())
+
+    def remove_rules(self, rules):
+        """
+        Remove rules from the trie, whether they came from the public suffix list or add_rules().
+        Unknown rules are ignored. See add_rules().
+        A rule with longer rules under it, e.g. co.uk with blogspot.co.uk, keeps its trie node,
+        and extract() matches every node it can walk, so a.b.co.uk still has the suffix co.uk.
+        Remove the longer rules too to drop it.
+        :param rules: Iterable of rules. The punycode form of an IDN rule is removed too.
+        :return:
+        """
+        rules = self._expand_rules(rules)
+        for rule in rules:
+            self._added_rules.pop(rule, None)
+            self._removed_rules.add(rule)
+        self._apply_rules({}, rules)
+
+    @staticmethod
+    def _expand_rules(rules):
+        """
+        Validate rules and add the punycode form of IDN rules. As in the public suffix list,
+        only the leftmost label may be a wildcard (*) or an exception (!label), and the rule
+        must have another label.
+        """
+        expanded = []
+        for rule in rules:
+            rule = rule.strip()
+            labels = rule.split(".")
+            names = labels
+            if labels[0] == "*" or labels[0].startswith("!"):
+                names = labels[1:] or [""]
+                if labels[0] != "*":
+                    names.append(labels[0][1:])
+            if any(not name or "*" in name or "!" in name for name in names):
+                raise Exception("Invalid public suffix rule: %r" % rule)
+            expanded.append(rule)
+            if not rule.isascii():
+                expanded.append(punycode(rule))
+        return expanded
+
+    def _tld_rules(self, trie, tld):
+        """
+        Rules of one TLD, read back from its sub-trie.
+        :return: dict of rule to private
+        """
+        rules = {}
+        if tld not in trie:
+            return rules
+        stack = [(trie[tld], tld, tld in trie.get(PRIVATE_KEY, NO_PRIVATE_KEYS))]
+        while stack:
+            node, rule, private = stack.pop()
+            if node is True:
+                rules[rule] = private
+                continue
+            tags = node.get(PRIVATE_KEY, NO_PRIVATE_KEYS)
+            for key, child in node.items():
+                if key == "_END":
+                    rules[rule] = private or "_END" in tags
+                elif key != PRIVATE_KEY:
+                    if child is True and not tags:
+                        rules[key + "." + rule] = private
+                    else:
+                        stack.append((child, key + "." + rule, private or key in tags))
+        return rules
+
+    def _apply_rules(self, added, removed):
+        """
+        Rebuild the sub-trie of every TLD touched by added or removed rules, and swap in a copy of
+        the trie root holding them. Sub-tries of other TLDs are shared with the previous trie.
+        :param added: dict of rule to private.
+        :param removed: Iterable of rules.
+        :return: Sorted list of the rebuilt TLDs.
+        """
+        if self.exclude_private_suffix:
+            added = dict((rule, private) for rule, private in added.items() if not private)
+        by_tld = {}
+        for rule in removed:
+            by_tld.setdefault(rule.rsplit(".", 1)[-1], ({}, set()))[1].add(rule)
+        for rule, private in added.items():
+            by_tld.setdefault(rule.rsplit(".", 1)[-1], ({}, set()))[0][rule] = private
+        with _rules_lock:
+            trie = self.trie.copy()
+            lazy = isinstance(trie, LazyTrie)
+            private_tlds = set(trie.get(PRIVATE_KEY, NO_PRIVATE_KEYS))
+            for tld, (tld_added, tld_removed) in by_tld.items():
+                if lazy and not dict.__contains__(trie, tld):
+                    # Not built yet, only update its pending rules
+                    rules = dict(trie.rules(tld)) if tld in trie.pending else {}
+                else:
+                    rules = self._tld_rules(trie, tld)
+                for rule in tld_removed:
+                    rules.pop(rule, None)
+                rules.update(tld_added)
+                private_tlds.discard(tld)
+                if lazy and not dict.__contains__(trie, tld):
+                    trie.set_rules(tld, list(rules.items()))
+                    if rules and all(rules.values()):
+                        private_tlds.add(sys.intern(tld))
+                    continue
+                sub_trie = self._tld_trie(rules.items())
+                trie.pop(tld, None)
+                if tld in sub_trie:
+                    trie[sys.intern(tld)] = sub_trie[tld]
+                    if tld in sub_trie.get(PRIVATE_KEY, NO_PRIVATE_KEYS):
+                        private_tlds.add(tld)
+            trie.pop(PRIVATE_KEY, None)
+            if private_tlds:
+                trie[PRIVATE_KEY] = private_tlds
+            self.trie = trie
+        return sorted(by_tld)
+
+    def _tld_trie(self, rules):
+        """
+        Build the sub-trie of one TLD.
+        :param rules: Iterable of (rule, private) of the TLD.
+        :return: a trie dict holding only the TLD
+        """
+        sub_trie = {}
+        # ICANN section rules first, as in _trie_construct()
+        for suffix, private in sorted(rules, key=lambda rule: rule[1]):
+            sp = [sys.intern(label) for label in suffix.split(".")]
+            sp.reverse()
+            if private:
+                self.nested_dict_private(sub_trie, sp)
+            else:
+                self.nested_dict(sub_trie, sp)
+        return sub_trie
+
     def __call__(self, *args, **kwargs):
         return self.extract(*args, **kwargs)
 
-    def extract(self, raw_url, subdomain=True, format=False):
+    def _install_extract(self):
+        """Route extract() through _extract_instrumented() only while instrumentation is enabled."""
+        if (self._profiling or self._metrics is not None or self._slow_call_hook is not None
+                or self._rule_hits is not None):
+            self.extract = self._extract_instrumented
+        else:
+            self.__dict__.pop("extract", None)
+
+    def enable_profiling(self):
+        """
+        Collect cumulative nanosecond timings and call counts of every stage of extract(),
+        see profile_report(). While profiling is disabled, extract() runs uninstrumented.
+        """
+        if self._profile is None:
+            self._profile = StageProfile()
+        self._profiling = True
+        self._install_extract()
+
+    def disable_profiling(self):
+        """Stop collecting stage timings. Timings collected so far are kept."""
+        self._profiling = False
+        self._install_extract()
+
+    def profile_report(self, reset=False):
+        """
+        Stage timings collected by extract() since enable_profiling().
+        Stages are input (whitespace stripping and encoding), scheme, userinfo, host (bracket and
+        host end scan), ipv6, idna, port_path, ipv4, split (label split) and trie_walk.
+        Each stage starts at a call to a helper of the parser and lasts until the next one, so
+        ipv6 (bracketed hosts), idna (format=True) and port_path (anything after the host) only
+        appear when that helper is called, and host otherwise covers the work they would have.
+        A call only counts towards the stages it reached. The bulk methods, e.g. extract_batch(),
+        call the parser directly and are not profiled.
+        :param reset: Clear the timings after reporting them.
+        :return: dict(calls=..., total_ns=..., stages={stage: dict(calls, total_ns, mean_ns,
+        share)})
+        """
+        if self._profile is None:
+            return StageProfile().report()
+        report = self._profile.report()
+        if reset:
+            self._profile.reset()
+        return report
+
+    def enable_metrics(self):
+        """
+        Count extract() calls, invalid and rejected URLs, IPv4 and IPv6 hosts and IDN conversions,
+        and record a latency histogram, see stats(). While metrics are disabled,
+        extract() runs uninstrumented.
+        """
+        if self._metrics is None:
+            self._metrics = Metrics()
+        self._install_extract()
+
+    def disable_metrics(self):
+        """Stop collecting metrics and discard them."""
+        self._metrics = None
+        self._install_extract()
+
+    def stats(self, reset=False):
+        """
+        Runtime metrics of this instance. Call counters stay at zero unless enable_metrics() was
+        called.
+        They only count extract() calls: extract_batch(), extract_file(), extract_arrow() and the
+        pandas and Parquet helpers built on them bypass the counters to keep bulk runs fast.
+        calls: extract() calls.
+        invalid: calls whose host has no registrable domain, e.g. an unlisted TLD.
+        rejected: calls from which no host could be extracted.
+        ipv4, ipv6: calls whose host is an IP address.
+        idn_conversions: calls with format=True on non-ASCII input.
+        trie_constructions: tries built from a public suffix list by this instance.
+        :param reset: Clear the call counters and latency histogram after reporting them.
+        :return: dict of counters, plus latency: dict(count, sum_seconds,
+        buckets=[(upper bound in seconds, cumulative count), ...])
+        """
+        metrics = self._metrics if self._metrics is not None else Metrics()
+        stats = metrics.stats()
+        if reset:
+            metrics.reset()
+        stats["trie_constructions"] = self.trie_constructions
+        return stats
+
+    def prometheus_metrics(self, prefix="fasttld"):
+        """
+        stats() in the Prometheus text exposition format, for scraping without a client library.
+        :param prefix: Metric name prefix.
+        :return: str
+        """
+        return prometheus_text(self.stats(), prefix)
+
+    def set_slow_call_hook(self, callback, threshold_ns=None, sample_every=None):
+        """
+        Call callback(raw_url, duration_ns, stages) for every extract() call taking at least
+        threshold_ns nanoseconds, and for 1 in every sample_every calls.
+        stages is a list of (stage, nanoseconds), as in profile_report(). Sampled calls run the
+        profiled parser. A slow call runs the regular parser and is then replayed through the
+        profiled parser for its stages, which may therefore differ from the slow run.
+        Without a hook, extract() runs uninstrumented. Bulk methods such as extract_batch() are
+        never traced.
+        :param callback: Function of (raw_url, duration_ns, stages), or None to remove the hook.
+        :param threshold_ns: Latency threshold in nanoseconds.
+        :param sample_every: Sample 1 in every sample_every calls.
+        """
+        if callback is None:
+            self._slow_call_hook = None
+        else:
+            self._slow_call_hook = SlowCallHook(callback, threshold_ns, sample_every)
+        self._install_extract()
+
+    def enable_rule_hits(self):
+        """
+        Count which public suffix list rules and trie nodes extract() matches, see rule_hits().
+        While counting is disabled, extract() runs uninstrumented.
+        """
+        if self._rule_hits is None:
+            self._rule_hits = RuleHits()
+        self._install_extract()
+
+    def disable_rule_hits(self):
+        """Stop counting rule hits and discard the counts."""
+        self._rule_hits = None
+        self._install_extract()
+
+    def rule_hits(self, reset=False):
+        """
+        Rule and trie node hit counts collected by extract() since enable_rule_hits().
+        rules: hits of each matched rule, e.g. com, co.uk, *.ck or !www.ck. Hosts without a listed
+        suffix count towards the default rule, *. IP addresses and rejected URLs are not counted.
+        nodes: hits of each trie node visited on the way, e.g. uk and co.uk for co.uk.
+        Only extract() results are counted, not those of the bulk methods, e.g. extract_batch().
+        :param reset: Clear the counts after reporting them.
+        :return: dict(rules={rule: hits}, nodes={node: hits}), each from most to least hit
+        """
+        if self._rule_hits is None:
+            return RuleHits().report()
+        report = self._rule_hits.report()
+        if reset:
+            self._rule_hits.reset()
+        return report
+
+    def memory_report(self):
+        """
+        Size of the trie of this instance, measured with sys.getsizeof.
+        nodes: dicts in the trie, including the root.
+        leaves: keys ending a rule without a sub-dict.
+        keys, distinct_keys: keys in the trie, and distinct str objects among them.
+        node_bytes, key_bytes, other_bytes, total_bytes: bytes held by the trie.
+        interning_savings_bytes: bytes saved by sharing interned keys.
+        With lazy=True, only built sub-tries are counted, plus pending_tlds and index_bytes: TLDs
+        not built yet and the bytes of their rules, which are included in total_bytes.
+        :return: dict
+        """
+        trie = self.trie
+        if not isinstance(trie, LazyTrie):
+            return trie_memory_report(trie)
+        # Lookups may be building TLDs meanwhile
+        trie, pending = trie.snapshot()
+        report = trie_memory_report(trie)
+        report.update(LazyTrie.index_report(pending))
+        report["total_bytes"] += report["index_bytes"]
+        return report
+
+    def _extract_instrumented(self, raw_url, subdomain=True, format=False, include_private=None):
+        if include_private and self.exclude_private_suffix:
+            raise Exception(EXCLUDED_PRIVATE_SUFFIX_ERROR)
+        hook = self._slow_call_hook
+        sampled = hook is not None and hook.sampled()
+        profiled = self._profiling or sampled
+        start = perf_counter_ns()
+        netloc_with_scheme = memoryview(bytes(raw_url.strip(whitespace), 'utf-8'))
+        if profiled:
+            ticks = [("input", start)]
+            res = run_profiled(_extract_bytes_profiled, ticks, self, netloc_with_scheme, subdomain,
+                               format, include_private=include_private)
+        else:
+            res = self._extract_bytes(netloc_with_scheme, subdomain, format,
+                                      include_private=include_private)
+        end = perf_counter_ns()
+        if self._profiling:
+            self._profile.add(stage_durations(ticks, end))
+        if self._metrics is not None:
+            self._metrics.observe(raw_url, format, res, end - start)
+        if self._rule_hits is not None:
+            self._rule_hits.observe(self.trie, res,
+                                    PRIVATE_KEY if include_private is False else None)
+        if hook is not None and (sampled or hook.is_slow(end - start)):
+            if profiled:
+                stages = stage_durations(ticks, end)
+            else:
+                ticks = [("input", perf_counter_ns())]
+                run_profiled(_extract_bytes_profiled, ticks, self,
+                             memoryview(bytes(raw_url.strip(whitespace), 'utf-8')),
+                             subdomain, format, include_private=include_private)
+                stages = stage_durations(ticks, perf_counter_ns())
+            hook.callback(raw_url, end - start, stages)
+        return res
+
+    def extract(self, raw_url, subdomain=True, format=False, include_private=None):
         """
         Extract suffix and subdomain from a Domain.
         :param raw_url:
         :param subdomain: Output options. This option will reduce efficiency. Maybe 10%
         :param format: To format raw_url string.
+        :param include_private: Match private section suffixes (eg, blogspot.com) too.
+        Defaults to not exclude_private_suffix. False is allowed on any instance, True requires
+        private suffixes, see is_private_suffix().
         :return: NamedTuple(scheme, userinfo, subdomain, domain, suffix, port, path, domain_name)
         >>> FastTLDExtract.extract('www.google.com.hk', subdomain=True)
         >>> TLDResult(scheme='', userinfo='', subdomain='www', domain='google', suffix='com.hk', port='', path='', domain_name='google.com.hk')
@@ -205,6 +919,247 @@ class FastTLDExtract(object):
         >>> FastTLDExtract.extract('127.0.0.1', subdomain=True)
         >>> TLDResult(scheme='', userinfo='', subdomain='', domain='127.0.0.1', suffix='', port='', path='', domain_name='127.0.0.1')
         """
+        if include_private and self.exclude_private_suffix:
+            raise Exception(EXCLUDED_PRIVATE_SUFFIX_ERROR)
+        return self._extract_bytes(memoryview(bytes(raw_url.strip(whitespace), 'utf-8')),
+                                   subdomain, format, include_private=include_private)
+
+    def extract_batch(self, raw_urls, subdomain=True, format=False, dedupe=False, stats=None,
+                      include_private=None):
+        """
+        Extract a batch of URLs.
+        :param raw_urls: Iterable of URLs.
+        :param subdomain: Output options. This option will reduce efficiency. Maybe 10%
+        :param format: To format raw_url string.
+        :param dedupe: Parse each distinct URL and each distinct host only once within the batch,
+        and share the resulting TLDResult between all occurrences.
+        :param stats: Optional dict, filled in with the number of urls in the batch, the number of
+        parsed_urls and parsed_hosts, and the dedup_ratio (urls / parsed_urls).
+        :param include_private: As in extract().
+        :return: List of TLDResult, in the same order as raw_urls.
+        """
+        if include_private and self.exclude_private_suffix:
+            raise Exception(EXCLUDED_PRIVATE_SUFFIX_ERROR)
+        if not dedupe:
+            results = [self._extract_bytes(memoryview(bytes(raw_url.strip(whitespace), 'utf-8')),
+                                           subdomain, format, include_private=include_private)
+                       for raw_url in raw_urls]
+            parsed_urls = parsed_hosts = len(results)
+        else:
+            url_cache = {}
+            host_cache = {}
+            results = []
+            for raw_url in raw_urls:
+                res = url_cache.get(raw_url)
+                if res is None:
+                    res = url_cache[raw_url] = self._extract_bytes(
+                        memoryview(bytes(raw_url.strip(whitespace), 'utf-8')),
+                        subdomain, format, host_cache, include_private)
+                results.append(res)
+            parsed_urls, parsed_hosts = len(url_cache), len(host_cache)
+        if stats is not None:
+            stats["urls"] = len(results)
+            stats["parsed_urls"] = parsed_urls
+            stats["parsed_hosts"] = parsed_hosts
+            stats["dedup_ratio"] = float(len(results)) / parsed_urls if parsed_urls else 1.0
+        return results
+
+    def extract_file(self, file_path, subdomain=True, format=False, include_private=None,
+                     errors="empty"):
+        """
+        Extract every line of a newline-delimited file of URLs.
+        The file is memory-mapped and each line is handed to the parser as a zero-copy slice,
+        so no per-line str objects are created before parsing. Parsing dominates either way,
+        so this is about as fast as extract() over open(file_path) but uses less memory.
+        :param file_path: Path to the file.
+        :param subdomain: Output options. This option will reduce efficiency. Maybe 10%
+        :param format: To format raw_url string.
+        :param include_private: As in extract().
+        :param errors: What to do with a line that is not valid UTF-8, e.g. Latin-1 bytes:
+        "empty" yields an empty TLDResult for it, "strict" raises.
+        :return: Generator of TLDResult, one for each line of the file (empty lines included).
+        """
+        # Checked here rather than in the generator, which would only raise on the first next()
+        if include_private and self.exclude_private_suffix:
+            raise Exception(EXCLUDED_PRIVATE_SUFFIX_ERROR)
+        if errors not in ("empty", "strict"):
+            raise Exception("errors must be 'empty' or 'strict', not %r" % (errors,))
+        return self._extract_file(file_path, subdomain, format, include_private, errors)
+
+    def _extract_file(self, file_path, subdomain, format, include_private, errors):
+        with open(file_path, 'rb') as fd:
+            if not os.fstat(fd.fileno()).st_size:
+                return
+            mm = mmap(fd.fileno(), 0, access=ACCESS_READ)
+        buf = line = None
+        invalid_offset = None
+        try:
+            buf = memoryview(mm)
+            size = len(buf)
+            start = 0
+            while start < size:
+                end = mm.find(b"\n", start)
+                if end == -1:
+                    end = size
+                line = buf[start:end]
+                try:
+                    # Most lines have nothing to strip, skip the call for them
+                    if (end == start or buf[start] in lineEdgeStripSet
+                            or buf[end-1] in lineEdgeStripSet):
+                        line = strip_whitespace_bytes(line)
+                    res = self._extract_bytes(line, subdomain, format,
+                                              include_private=include_private)
+                except UnicodeDecodeError:
+                    # Not raised from here, its traceback holds slices of buf
+                    if errors == "strict":
+                        invalid_offset = start
+                        break
+                    res = EMPTY_RESULT
+                yield res
+                start = end + 1
+        finally:
+            # All slices must be released before the mapping can be closed
+            line = None
+            raising = sys.exc_info()[1] is not None
+            try:
+                if buf is not None:
+                    buf.release()
+                mm.close()
+            except BufferError:
+                # The traceback of the exception being raised still holds slices of buf, do not
+                # hide it. The mapping is closed once the traceback is collected.
+                if not raising:
+                    raise
+        if invalid_offset is not None:
+            raise Exception("Line at byte %d of %s is not valid UTF-8"
+                            % (invalid_offset, file_path))
+
+    def extract_arrow(self, array, subdomain=True, format=False, batch_size=65536,
+                      include_private=None):
+        """
+        Extract every value of an Apache Arrow string array. Requires pyarrow.
+        URLs are parsed straight from the Arrow offsets and data buffers.
+        :param array: pyarrow StringArray, LargeStringArray or ChunkedArray of strings.
+        :param subdomain: Output options. This option will reduce efficiency. Maybe 10%
+        :param format: To format raw_url string.
+        :param batch_size: Number of rows converted to Arrow at a time.
+        :param include_private: As in extract().
+        :return: pyarrow Table with one column per TLDResult field. The scheme and suffix
+        columns are dictionary-encoded. Null inputs give null rows.
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("extract_arrow() requires pyarrow: pip install fasttld[arrow]")
+        if include_private and self.exclude_private_suffix:
+            raise Exception(EXCLUDED_PRIVATE_SUFFIX_ERROR)
+
+        dictionary_fields = ("scheme", "suffix")
+        columns = dict((field, []) for field in TLDResult._fields)
+        empty_row = (None,) * len(TLDResult._fields)
+
+        def flush(rows):
+            for field, values in zip(TLDResult._fields, zip(*rows)):
+                col = pa.array(values, type=pa.string())
+                if field in dictionary_fields:
+                    col = col.dictionary_encode()
+                columns[field].append(col)
+
+        chunks = array.chunks if isinstance(array, pa.ChunkedArray) else [array]
+        for chunk in chunks:
+            if not (pa.types.is_string(chunk.type) or pa.types.is_large_string(chunk.type)):
+                chunk = chunk.cast(pa.large_string())
+            validity, offsets, data = chunk.buffers()
+            offsets = memoryview(offsets).cast('q' if pa.types.is_large_string(chunk.type) else 'i')
+            data = memoryview(data if data is not None else b'')
+            validity = memoryview(validity) if chunk.null_count else None
+            base = chunk.offset
+            rows = []
+            for i in range(base, base + len(chunk)):
+                if validity is not None and not (validity[i >> 3] >> (i & 7)) & 1:
+                    rows.append(empty_row)
+                else:
+                    rows.append(self._extract_bytes(
+                        strip_whitespace_bytes(data[offsets[i]:offsets[i+1]]), subdomain, format,
+                        include_private=include_private))
+                if len(rows) == batch_size:
+                    flush(rows)
+                    rows = []
+            if rows:
+                flush(rows)
+
+        return pa.table(dict(
+            (field, pa.chunked_array(
+                columns[field],
+                type=pa.dictionary(pa.int32(), pa.string()) if field in dictionary_fields
+                else pa.string()))
+            for field in TLDResult._fields
+        ))
+
+    def _icann_suffix_length(self, labels):
+        """
+        The trie walk of _extract_bytes(), skipping the private section keys of every node.
+        :param labels: Labels and separators of a host.
+        :return: Number of items at the end of labels that the walk matched.
+        """
+        node = self.trie
+        len_suffix = 0
+        for label in reversed(labels):
+            if label in labelSeparatorsSet:
+                len_suffix += 1
+                continue
+            if node is True:
+                break
+            private = node.get(PRIVATE_KEY, NO_PRIVATE_KEYS)
+            if "_END" in node and "_END" not in private:
+                if label in node and label not in private:
+                    len_suffix += 1
+                    node = node[label]
+                    continue
+            if "*" in node and "*" not in private:
+                exception = "!%s" % label
+                if exception not in node or exception in private:
+                    len_suffix += 1
+                break
+            if label in node and label not in private:
+                len_suffix += 1
+                node = node[label]
+            else:
+                break
+        return len_suffix
+
+    def is_private_suffix(self, suffix):
+        """
+        Whether a suffix returned by extract() comes from a private section rule.
+        Always False if private suffixes were excluded.
+        >>> FastTLDExtract().is_private_suffix('blogspot.co.uk')
+        >>> True
+        :param suffix: suffix of a TLDResult.
+        :return: bool
+        """
+        node = self.trie
+        for label in reversed(SPLIT_RE.split(suffix)[::2]):
+            if node is True:
+                return False
+            private = node.get(PRIVATE_KEY, NO_PRIVATE_KEYS)
+            if ("_END" not in node or label not in node) and "*" in node:
+                return "*" in private
+            if label not in node:
+                return False
+            if label in private:
+                return True
+            node = node[label]
+        return node is not True and "_END" in node.get(PRIVATE_KEY, NO_PRIVATE_KEYS)
+
+    def _extract_bytes(self, netloc_with_scheme, subdomain, format, host_cache=None,
+                       include_private=None):
+        """
+        Byte-level parser behind extract(), extract_file() and extract_arrow().
+        :param netloc_with_scheme: memoryview of the UTF-8 encoded URL, stripped of whitespace
+        :param host_cache: Optional dict from host bytes to (subdomain, domain, suffix, domain_name)
+        that is read and filled in, so that each distinct host is only split once.
+        :param include_private: False to skip private section suffixes of a trie that has them.
+        """
 
         def urlParts():
             return TLDResult(
@@ -222,7 +1177,6 @@ class FastTLDExtract(object):
         ret_suffix = ret_port = ret_path = ret_domain_name = ""
 
         # Extract URL scheme
-        netloc_with_scheme = memoryview(bytes(raw_url.strip(whitespace), 'utf-8'))
         schemeEndIdx = getSchemeEndIndex(netloc_with_scheme)
         netloc = netloc_with_scheme[schemeEndIdx:]
         ret_scheme = str(netloc_with_scheme[:schemeEndIdx], 'utf-8')
@@ -289,7 +1243,7 @@ class FastTLDExtract(object):
         invalid_punycode = False
         if format:
             try:
-                netloc = memoryview(str(netloc, 'utf-8').encode('idna'))
+                netloc = encode_idna(netloc)
             except Exception:
                 netloc = memoryview(b'')
                 invalid_punycode = True
@@ -319,56 +1273,68 @@ class FastTLDExtract(object):
             # Is IPv6 address
             return urlParts()
 
+        # Reuse the split of a host already seen in this batch
+        if host_cache is not None:
+            host = bytes(netloc)
+            if host in host_cache:
+                ret_subdomain, ret_domain, ret_suffix, ret_domain_name = host_cache[host]
+                return urlParts()
+
         # Check for IPv4 address
         if looks_like_ip(netloc):
             ret_domain = ret_domain_name = str(netloc, 'utf-8')
+            if host_cache is not None:
+                host_cache[host] = (ret_subdomain, ret_domain, ret_suffix, ret_domain_name)
             return urlParts()
 
-        labels = SPLIT_RE.split(str(netloc, 'utf-8'))
+        labels = split_labels(str(netloc, 'utf-8'))
 
         node = self.trie  # define the root node
         len_suffix = 0
         len_labels = len(labels)
-        for label in reversed(labels):
-            if label not in labelSeparatorsSet:
-                pass
-                # try:
-                #     decode(label)
-                # except Exception:
-                #     return urlParts()
-            else:
-                len_suffix += 1
-                continue
-            if node is True:  # or alternatively if type(node) is not dict:
-                # This node is an end node.
-                ret_domain = label
-                break
+        if include_private is False and not self.exclude_private_suffix:
+            len_suffix = self._icann_suffix_length(labels)
+        else:
+            for label in reversed(labels):
+                if label not in labelSeparatorsSet:
+                    pass
+                    # try:
+                    #     decode(label)
+                    # except Exception:
+                    #     return urlParts()
+                else:
+                    len_suffix += 1
+                    continue
+                if node is True:  # or alternatively if type(node) is not dict:
+                    # This node is an end node.
+                    ret_domain = label
+                    break
+
+                # This node has sub-nodes and maybe an end-node.
+                # eg. cn -> (cn, gov.cn)
+                if "_END" in node:
+                    # check if there is a sub node
+                    # eg. gov.cn
+                    if label in node:
+                        len_suffix += 1
+                        node = node[label]
+                        continue
+
+                if "*" in node:
+                    # check if there is a sub node
+                    # eg. www.ck
+                    if ("!%s" % label) in node:
+                        ret_domain = label
+                    else:
+                        len_suffix += 1
+                    break
 
-            # This node has sub-nodes and maybe an end-node.
-            # eg. cn -> (cn, gov.cn)
-            if "_END" in node:
-                # check if there is a sub node
-                # eg. gov.cn
+                # check a TLD in PSL
                 if label in node:
                     len_suffix += 1
                     node = node[label]
-                    continue
-
-            if "*" in node:
-                # check if there is a sub node
-                # eg. www.ck
-                if ("!%s" % label) in node:
-                    ret_domain = label
                 else:
-                    len_suffix += 1
-                break
-
-            # check a TLD in PSL
-            if label in node:
-                len_suffix += 1
-                node = node[label]
-            else:
-                break
+                    break
 
         if len_suffix and labels[-len_suffix] in labelSeparatorsSet:
             len_suffix -= 1
@@ -381,5 +1347,19 @@ class FastTLDExtract(object):
                 ret_subdomain = "".join(labels[:domain_idx-1])
         if ret_domain and ret_suffix:
             ret_domain_name = "".join(labels[len_labels-len_suffix-2:])
+        if host_cache is not None:
+            host_cache[host] = (ret_subdomain, ret_domain, ret_suffix, ret_domain_name)
 
         return urlParts()
+
+
+# _extract_bytes() marking a stage boundary at each helper it calls, see enable_profiling()
+_extract_bytes_profiled = profiled_copy(FastTLDExtract._extract_bytes, {
+    "getSchemeEndIndex": stage_helper(getSchemeEndIndex, "scheme"),
+    "index_last_char_before": stage_helper(index_last_char_before, "userinfo", "host"),
+    "is_ipv6": stage_helper(is_ipv6, "ipv6"),
+    "encode_idna": stage_helper(encode_idna, "idna"),
+    "index_any": stage_helper(index_any, "port_path"),
+    "looks_like_ip": stage_helper(looks_like_ip, "ipv4"),
+    "split_labels": stage_helper(split_labels, "split", "trie_walk"),
+})
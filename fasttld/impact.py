@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Find the hosts whose (domain, suffix) split changes between two versions of the public suffix
+list, e.g. to re-bucket stored registered domains after an update.
+
+The two tries are compared to find the host prefixes whose trie walk may differ, e.g. hosts
+under blogspot.com when a rule for tenant.blogspot.com is added, and only the hosts under
+those prefixes are extracted again.
+
+$ python -m fasttld.impact old_public_suffix_list.dat new_public_suffix_list.dat hosts.txt
+
+@author: Wu Tingfeng
+@file: impact.py
+
+Copyright (c) 2022 Wu Tingfeng
+"""
+import argparse
+from bisect import bisect_left
+
+from fasttld.FastTLDExtract import (NO_PRIVATE_KEYS, PRIVATE_KEY, SPLIT_RE, FastTLDExtract,
+                                    LazyTrie, labelSeparatorsSet)
+
+# Keys of a trie node that change how every label after the node is matched
+NODE_FLAGS = ("_END", "*")
+
+
+def _keys(node):
+    """Keys of a trie node, including TLDs not built yet in a lazy trie."""
+    if isinstance(node, LazyTrie):
+        built, pending = node.snapshot()
+        return set(built) | set(pending)
+    return set(node)
+
+
+def _child(node, key):
+    """node[key], building it in a lazy trie, or None."""
+    return node[key] if key in node else None
+
+
+def changed_prefixes(before, after):
+    """
+    Compare two tries and find the hosts whose trie walk may differ between them.
+    :param before: Trie of FastTLDExtract before the change.
+    :param after: Trie of FastTLDExtract after the change.
+    :return: Sorted list of prefixes of reversed labels, e.g. "com.blogspot" for blogspot.com and
+    the hosts under it, or "" for every host.
+    """
+    prefixes = []
+    stack = [(before, after, "")]
+    while stack:
+        a, b, prefix = stack.pop()
+        if a is b:
+            continue
+        if not isinstance(a, dict) or not isinstance(b, dict):
+            # Added, removed, or a leaf turned into a node
+            prefixes.append(prefix)
+            continue
+        if a == b and getattr(a, "pending", None) == getattr(b, "pending", None):
+            continue
+        a_tags = a.get(PRIVATE_KEY, NO_PRIVATE_KEYS)
+        b_tags = b.get(PRIVATE_KEY, NO_PRIVATE_KEYS)
+        if any((key in a) != (key in b) or (key in a_tags) != (key in b_tags)
+               for key in NODE_FLAGS):
+            prefixes.append(prefix)
+            continue
+        for key in _keys(a) | _keys(b):
+            if key in NODE_FLAGS or key == PRIVATE_KEY:
+                continue
+            # An exception rule !label only changes hosts with that label
+            label = key[1:] if key.startswith("!") else key
+            child_prefix = prefix + "." + label if prefix else label
+            tagged = (key in a_tags) != (key in b_tags)
+            if key.startswith("!"):
+                if tagged or (key in a) != (key in b):
+                    prefixes.append(child_prefix)
+            elif tagged:
+                prefixes.append(child_prefix)
+            else:
+                stack.append((_child(a, key), _child(b, key), child_prefix))
+    return sorted(set(prefixes))
+
+
+def reversed_host(host):
+    """'www.example.com' -> 'com.example.www', with any label separator."""
+    labels = [label for label in SPLIT_RE.split(host) if label not in labelSeparatorsSet]
+    labels.reverse()
+    return ".".join(labels)
+
+
+class HostIndex(object):
+    """
+    Hosts sorted by their reversed labels, so that the hosts under a prefix are found with a
+    binary search. Build it once for a large set of stored hosts and reuse it across updates.
+    """
+
+    def __init__(self, hosts):
+        """
+        :param hosts: Iterable of hosts, e.g. www.example.com. Duplicates are indexed once.
+        """
+        pairs = sorted(set((reversed_host(host), host) for host in hosts))
+        self.keys = [key for key, _ in pairs]
+        self.hosts = [host for _, host in pairs]
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def under(self, prefix):
+        """
+        :param prefix: Reversed labels, e.g. "com.blogspot", or "" for every host.
+        :return: List of the hosts equal to or under the prefix.
+        """
+        if not prefix:
+            return list(self.hosts)
+        keys = self.keys
+        found = []
+        # "com.blogspot-x" sorts between "com.blogspot" and "com.blogspot.x", so look up the
+        # host equal to the prefix and the hosts under it ("." < "/") separately
+        for start, end in ((prefix, prefix + "\0"), (prefix + ".", prefix + "/")):
+            i = bisect_left(keys, start)
+            j = bisect_left(keys, end, i)
+            found.extend(self.hosts[i:j])
+        return found
+
+
+def changed_hosts(hosts, before, after, include_private=None):
+    """
+    Hosts whose (domain, suffix) split differs between two FastTLDExtract instances, e.g. built
+    from two versions of the public suffix list, or two snapshots of a SnapshotStore.
+    :param hosts: HostIndex, or iterable of hosts to index.
+    :param before: FastTLDExtract before the change.
+    :param after: FastTLDExtract after the change.
+    :param include_private: As in FastTLDExtract.extract().
+    :return: List of (host, before TLDResult, after TLDResult), in HostIndex order.
+    """
+    index = hosts if isinstance(hosts, HostIndex) else HostIndex(hosts)
+    candidates = set()
+    for prefix in changed_prefixes(before.trie, after.trie):
+        candidates.update(index.under(prefix))
+    changed = []
+    for host in sorted(candidates, key=reversed_host):
+        old = before.extract(host, include_private=include_private)
+        new = after.extract(host, include_private=include_private)
+        if (old.domain, old.suffix) != (new.domain, new.suffix):
+            changed.append((host, old, new))
+    return changed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="List the hosts whose domain and suffix change between two public suffix "
+                    "lists, as tab separated host, before and after domain_name and suffix.")
+    parser.add_argument("before", help="public suffix list file before the change")
+    parser.add_argument("after", help="public suffix list file after the change")
+    parser.add_argument("hosts", help="file of hosts, one per line")
+    parser.add_argument("--exclude-private-suffix", action="store_true",
+                        help="exclude private suffixes")
+    args = parser.parse_args(argv)
+    before = FastTLDExtract(exclude_private_suffix=args.exclude_private_suffix,
+                            file_path=args.before)
+    after = FastTLDExtract(exclude_private_suffix=args.exclude_private_suffix,
+                           file_path=args.after)
+    with open(args.hosts, encoding="utf-8") as f:
+        index = HostIndex(line.strip() for line in f if line.strip())
+    for host, old, new in changed_hosts(index, before, after):
+        print("\t".join((host, old.domain_name, old.suffix, new.domain_name, new.suffix)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Opt-in instrumentation of FastTLDExtract: stage timings, runtime metrics, slow call tracing,
+rule hit counts and memory reports.
+
+Stage timings come from a copy of the parser function that shares its code but not its globals:
+the helpers it calls at stage boundaries are replaced by wrappers that take timestamps, so the
+regular parser is left untouched and there is no second copy of its source to keep in sync.
+
+@author: Wu Tingfeng
+@file: instrument.py
+
+Copyright (c) 2022 Wu Tingfeng
+"""
+import itertools
+import re
+import sys
+from bisect import bisect_left
+from collections import Counter
+from threading import Lock, local
+from time import perf_counter_ns
+from types import FunctionType
+
+# Same separators as FastTLDExtract.labelSeparators
+LABEL_SEPARATORS_RE = re.compile("[\u002e\u3002\uff0e\uff61]")
+
+# ticks of the profiled call running in each thread, see run_profiled()
+_profiled_call = local()
+
+
+def stage_helper(func, stage, next_stage=None):
+    """
+    Wrap a helper of a profiled function to mark a stage boundary.
+    :param func: Helper to wrap.
+    :param stage: Stage starting when the helper is called.
+    :param next_stage: Stage starting when the helper returns, if any.
+    :return: function
+    """
+    def helper(*args):
+        ticks = _profiled_call.ticks
+        ticks.append((stage, perf_counter_ns()))
+        res = func(*args)
+        if next_stage is not None:
+            ticks.append((next_stage, perf_counter_ns()))
+        return res
+    return helper
+
+
+def profiled_copy(func, helpers):
+    """
+    Copy of func sharing its code, with some of the globals it calls replaced, e.g. by
+    stage_helper() wrappers. The globals are copied when this is called, so call it once the
+    module of func is fully imported.
+    :param func: Function to copy.
+    :param helpers: dict of global name to replacement.
+    :return: function, to be called through run_profiled()
+    """
+    namespace = dict(func.__globals__)
+    namespace.update(helpers)
+    copy = FunctionType(func.__code__, namespace, func.__name__, func.__defaults__,
+                        func.__closure__)
+    copy.__kwdefaults__ = func.__kwdefaults__
+    return copy
+
+
+def run_profiled(func, ticks, *args, **kwargs):
+    """
+    Call a profiled_copy() with the list its stage helpers append (stage, perf_counter_ns()) to.
+    """
+    _profiled_call.ticks = ticks
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _profiled_call.ticks = None
+
+
+def stage_durations(ticks, end):
+    """
+    Duration of every stage reached by one call.
+    :param ticks: List of (stage, perf_counter_ns()) filled in by run_profiled().
+    :param end: perf_counter_ns() at the end of the call.
+    :return: List of (stage, nanoseconds)
+    """
+    return [(stage, (ticks[i+1][1] if i + 1 < len(ticks) else end) - t)
+            for i, (stage, t) in enumerate(ticks)]
+
+
+class StageProfile(object):
+    """Cumulative nanoseconds and call counts of every stage."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.total_ns = 0
+            self.stage_ns = {}
+            self.stage_calls = {}
+
+    def add(self, durations):
+        """
+        :param durations: List of (stage, nanoseconds) of one call.
+        """
+        with self._lock:
+            self.calls += 1
+            for stage, ns in durations:
+                self.total_ns += ns
+                self.stage_ns[stage] = self.stage_ns.get(stage, 0) + ns
+                self.stage_calls[stage] = self.stage_calls.get(stage, 0) + 1
+
+    def report(self):
+        """
+        :return: dict with the number of calls, their total_ns, and per stage
+        (in order of first appearance) its calls, total_ns, mean_ns and share of total_ns.
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "total_ns": self.total_ns,
+                "stages": dict(
+                    (stage, {
+                        "calls": self.stage_calls[stage],
+                        "total_ns": ns,
+                        "mean_ns": float(ns) / self.stage_calls[stage],
+                        "share": float(ns) / self.total_ns if self.total_ns else 0.0,
+                    })
+                    for stage, ns in self.stage_ns.items()
+                ),
+            }
+
+
+class SlowCallHook(object):
+    """Callback for extract() calls over a latency threshold, or for 1 in N sampled calls."""
+
+    def __init__(self, callback, threshold_ns=None, sample_every=None):
+        if threshold_ns is None and sample_every is None:
+            raise Exception("threshold_ns or sample_every is required")
+        if sample_every is not None and sample_every < 1:
+            raise Exception("sample_every must be at least 1")
+        self.callback = callback
+        self.threshold_ns = threshold_ns
+        self.sample_every = sample_every
+        # next() on itertools.count is atomic, so sampling needs no lock
+        self._calls = itertools.count()
+
+    def sampled(self):
+        """:return: True if the next call is one of the 1 in sample_every sampled calls."""
+        return self.sample_every is not None and next(self._calls) % self.sample_every == 0
+
+    def is_slow(self, ns):
+        return self.threshold_ns is not None and ns >= self.threshold_ns
+
+
+def matched_rule(trie, suffix, domain, private_key=None):
+    """
+    Find the rule that produced an extract() result by walking the trie along its suffix,
+    the same way the parser does.
+    :param trie: Trie the result was extracted with.
+    :param suffix: suffix of the result.
+    :param domain: domain of the result.
+    :param private_key: Key of the set of private section keys in each node, to skip them.
+    :return: (rule, nodes) where rule is e.g. "co.uk", "*.ck" or "!www.ck", or "*" (the default
+    rule) for a host with no listed suffix, and nodes lists the trie nodes visited,
+    e.g. ["uk", "co.uk"]
+    """
+    if not suffix:
+        return "*", []
+    node = trie
+    path = []
+    nodes = []
+    skipped = ()
+    for label in reversed(LABEL_SEPARATORS_RE.split(suffix)):
+        if node is True:
+            break
+        if private_key is not None:
+            skipped = node.get(private_key, ())
+        if ("_END" not in node or "_END" in skipped or label not in node or label in skipped):
+            if "*" in node and "*" not in skipped:
+                path.append("*")
+                break
+            if label not in node or label in skipped:
+                break
+        path.append(label)
+        nodes.append(".".join(reversed(path)))
+        node = node[label]
+    else:
+        exception = "!%s" % domain
+        if node is not True and private_key is not None:
+            skipped = node.get(private_key, ())
+        if (node is not True and "*" in node and "*" not in skipped and exception in node
+                and exception not in skipped):
+            path.append(exception)
+    return ".".join(reversed(path)), nodes
+
+
+class RuleHits(object):
+    """How often each rule and trie node is matched by extract()."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.rules = Counter()
+            self.nodes = Counter()
+
+    def observe(self, trie, res, private_key=None):
+        """
+        Count the rule matched by one extract() call. IP addresses and rejected URLs match no rule.
+        :param trie: Trie the result was extracted with.
+        :param res: TLDResult of the call.
+        :param private_key: See matched_rule().
+        """
+        if not res.suffix and (res.domain_name or not res.domain):
+            return
+        rule, nodes = matched_rule(trie, res.suffix, res.domain, private_key)
+        with self._lock:
+            self.rules[rule] += 1
+            self.nodes.update(nodes)
+
+    def report(self):
+        """
+        :return: dict(rules={rule: hits}, nodes={node: hits}), each from most to least hit
+        """
+        with self._lock:
+            return {"rules": dict(self.rules.most_common()),
+                    "nodes": dict(self.nodes.most_common())}
+
+
+# Upper bounds of the extract() latency histogram buckets, in nanoseconds
+LATENCY_BUCKETS_NS = (1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 500000,
+                      1000000, 2500000, 10000000)
+
+COUNTERS = (
+    ("calls", "Number of extract() calls."),
+    ("invalid", "extract() calls whose host has no registrable domain, e.g. an unlisted TLD."),
+    ("rejected", "extract() calls from which no host could be extracted."),
+    ("ipv4", "extract() calls whose host is an IPv4 address."),
+    ("ipv6", "extract() calls whose host is an IPv6 address."),
+    ("idn_conversions", "extract() calls with format=True on non-ASCII input."),
+)
+
+
+class Metrics(object):
+    """Counters and latency histogram of extract() calls."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = dict((name, 0) for name, _ in COUNTERS)
+            self.buckets = [0] * (len(LATENCY_BUCKETS_NS) + 1)
+            self.latency_ns = 0
+
+    def observe(self, raw_url, format, res, ns):
+        """
+        Count one extract() call.
+        :param raw_url: Input of the call.
+        :param format: format argument of the call.
+        :param res: TLDResult of the call.
+        :param ns: Duration of the call in nanoseconds.
+        """
+        with self._lock:
+            counters = self.counters
+            counters["calls"] += 1
+            if res.domain_name:
+                if not res.suffix:
+                    # Only IP addresses have a domain_name without a suffix
+                    counters["ipv6" if ":" in res.domain else "ipv4"] += 1
+            elif res.domain or res.suffix:
+                counters["invalid"] += 1
+            else:
+                counters["rejected"] += 1
+            if format and not raw_url.isascii():
+                counters["idn_conversions"] += 1
+            self.buckets[bisect_left(LATENCY_BUCKETS_NS, ns)] += 1
+            self.latency_ns += ns
+
+    def stats(self):
+        """
+        :return: dict of counters, plus latency: dict(count, sum_seconds,
+        buckets=[(upper bound in seconds, cumulative count), ...]) with float("inf") last.
+        """
+        with self._lock:
+            stats = dict(self.counters)
+            buckets = list(self.buckets)
+            latency_ns = self.latency_ns
+        cumulative = 0
+        stats["latency"] = {"count": sum(buckets), "sum_seconds": latency_ns / 1e9, "buckets": []}
+        for bound, count in zip(LATENCY_BUCKETS_NS + (float("inf"),), buckets):
+            cumulative += count
+            stats["latency"]["buckets"].append((bound / 1e9, cumulative))
+        return stats
+
+
+def prometheus_text(stats, prefix="fasttld"):
+    """
+    Render Metrics.stats() in the Prometheus text exposition format.
+    :param stats: dict from Metrics.stats(), plus an optional trie_constructions count.
+    :param prefix: Metric name prefix.
+    :return: str
+    """
+    lines = []
+    for name, help in COUNTERS:
+        metric = "%s_extract_%s_total" % (prefix, name)
+        lines += ["# HELP %s %s" % (metric, help), "# TYPE %s counter" % metric,
+                  "%s %d" % (metric, stats[name])]
+    if "trie_constructions" in stats:
+        metric = "%s_trie_constructions_total" % prefix
+        lines += ["# HELP %s Number of tries built from a public suffix list." % metric,
+                  "# TYPE %s counter" % metric, "%s %d" % (metric, stats["trie_constructions"])]
+    metric = "%s_extract_latency_seconds" % prefix
+    lines += ["# HELP %s Latency of extract() calls." % metric, "# TYPE %s histogram" % metric]
+    for bound, count in stats["latency"]["buckets"]:
+        le = "+Inf" if bound == float("inf") else repr(bound)
+        lines.append('%s_bucket{le="%s"} %d' % (metric, le, count))
+    lines += ["%s_sum %r" % (metric, stats["latency"]["sum_seconds"]),
+              "%s_count %d" % (metric, stats["latency"]["count"])]
+    return "\n".join(lines) + "\n"
+
+
+def trie_memory_report(trie):
+    """
+    Walk a trie of nested dicts and measure it with sys.getsizeof.
+    Shared objects, such as interned keys, are only counted once.
+    :param trie: Root dict of the trie.
+    :return: dict(nodes, leaves, keys, distinct_keys, node_bytes, key_bytes, other_bytes,
+    total_bytes, interning_savings_bytes), where interning_savings_bytes is how many
+    more bytes the keys would take if every occurrence were a separate str.
+    """
+    report = dict.fromkeys(("nodes", "leaves", "keys", "node_bytes", "other_bytes"), 0)
+    key_sizes = {}
+    key_occurrence_bytes = 0
+    seen = set()
+    stack = [trie]
+    while stack:
+        node = stack.pop()
+        report["nodes"] += 1
+        report["node_bytes"] += sys.getsizeof(node)
+        for key, value in node.items():
+            size = sys.getsizeof(key)
+            report["keys"] += 1
+            key_occurrence_bytes += size
+            key_sizes[id(key)] = size
+            if isinstance(value, dict):
+                stack.append(value)
+            elif value is True:
+                if not key.startswith("_"):
+                    report["leaves"] += 1
+            elif id(value) not in seen:
+                # Other node attributes, counted once each
+                seen.add(id(value))
+                report["other_bytes"] += sys.getsizeof(value)
+    report["distinct_keys"] = len(key_sizes)
+    report["key_bytes"] = sum(key_sizes.values())
+    report["total_bytes"] = report["node_bytes"] + report["key_bytes"] + report["other_bytes"]
+    report["interning_savings_bytes"] = key_occurrence_bytes - report["key_bytes"]
+    return report
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+pandas Series accessor, registered as ``Series.tld`` on import.
+
+>>> import fasttld.pandas_accessor
+>>> df.url.tld.extract()
+
+@author: Wu Tingfeng
+@file: pandas_accessor.py
+
+Copyright (c) 2022 Wu Tingfeng
+"""
+import pandas as pd
+
+from fasttld.FastTLDExtract import FastTLDExtract, TLDResult
+
+_default_extractor = None
+
+
+def _get_default_extractor():
+    global _default_extractor
+    if _default_extractor is None:
+        _default_extractor = FastTLDExtract()
+    return _default_extractor
+
+
+@pd.api.extensions.register_series_accessor("tld")
+class TLDAccessor(object):
+    def __init__(self, pandas_obj):
+        self._obj = pandas_obj
+
+    def extract(self, extractor=None, subdomain=True, format=False):
+        """
+        Extract every URL of the Series.
+        Each distinct URL (and host) is extracted once and the results are broadcast back to every
+        row, which is much faster than Series.apply(extractor.extract) on columns with duplicates.
+        :param extractor: FastTLDExtract instance to use. Defaults to a shared FastTLDExtract().
+        :param subdomain: Output options. This option will reduce efficiency. Maybe 10%
+        :param format: To format raw_url string.
+        :return: DataFrame with one column per TLDResult field, indexed like the Series.
+        Missing values give rows of NaN.
+        """
+        if extractor is None:
+            extractor = _get_default_extractor()
+        codes, uniques = pd.factorize(self._obj)
+        results = extractor.extract_batch(uniques, subdomain=subdomain, format=format, dedupe=True)
+        # Missing values (code -1) map to a trailing empty row
+        results.append((None,) * len(TLDResult._fields))
+        codes[codes < 0] = len(uniques)
+        frame = pd.DataFrame.from_records(results, columns=TLDResult._fields).take(codes)
+        frame.index = self._obj.index
+        return frame
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Enrich a Parquet file with FastTLDExtract result columns, one row group at a time.
+Requires pyarrow.
+
+$ python -m fasttld.parquet input.parquet output.parquet --column url
+
+@author: Wu Tingfeng
+@file: parquet.py
+
+Copyright (c) 2022 Wu Tingfeng
+"""
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from fasttld.FastTLDExtract import FastTLDExtract
+
+_worker_extractor = None
+
+
+def _init_worker(exclude_private_suffix, file_path):
+    global _worker_extractor
+    _worker_extractor = FastTLDExtract(exclude_private_suffix=exclude_private_suffix,
+                                       file_path=file_path)
+
+
+def enrich_table(table, extractor, column, fields=("domain_name", "suffix"), prefix=None,
+                 subdomain=True, format=False):
+    """
+    Append FastTLDExtract result columns to a pyarrow Table.
+    Each distinct URL in the column is extracted once and the results are broadcast back with take.
+    :param table: pyarrow Table.
+    :param extractor: FastTLDExtract instance.
+    :param column: Name of the URL column.
+    :param fields: TLDResult fields to append.
+    :param prefix: Prefix of the appended column names. Defaults to column + "_".
+    :param subdomain: Output options. This option will reduce efficiency. Maybe 10%
+    :param format: To format raw_url string.
+    :return: pyarrow Table.
+    """
+    if prefix is None:
+        prefix = column + "_"
+    for field in fields:
+        if prefix + field in table.column_names:
+            raise Exception("Column " + prefix + field + " already exists.")
+    urls = table.column(column).combine_chunks()
+    if not pa.types.is_dictionary(urls.type):
+        urls = pc.dictionary_encode(urls)
+    results = extractor.extract_arrow(urls.dictionary, subdomain=subdomain, format=format)
+    for field in fields:
+        table = table.append_column(prefix + field,
+                                    pc.take(results.column(field), urls.indices))
+    return table
+
+
+def _transform_row_group(source, index, column, fields, prefix, subdomain, format):
+    table = pq.ParquetFile(source).read_row_group(index)
+    return enrich_table(table, _worker_extractor, column, fields, prefix, subdomain, format)
+
+
+def transform_parquet(source, destination, column, fields=("domain_name", "suffix"), prefix=None,
+                      subdomain=True, format=False, exclude_private_suffix=False, file_path="",
+                      max_workers=None):
+    """
+    Read a Parquet file one row group at a time, append FastTLDExtract result columns
+    for its URL column, and write the row groups to a new Parquet file in their original order.
+    Row groups are processed in parallel by a process pool, with at most max_workers
+    row groups in flight, so memory is bounded by max_workers row groups.
+    :param source: Path of the input Parquet file.
+    :param destination: Path of the output Parquet file.
+    :param column: Name of the URL column.
+    :param fields: TLDResult fields to append.
+    :param prefix: Prefix of the appended column names. Defaults to column + "_".
+    :param subdomain: Output options. This option will reduce efficiency. Maybe 10%
+    :param format: To format raw_url string.
+    :param exclude_private_suffix: Passed to FastTLDExtract.
+    :param file_path: Passed to FastTLDExtract.
+    :param max_workers: Number of worker processes. Defaults to the number of CPUs.
+    1 processes every row group in the current process.
+    :return: Number of row groups written.
+    """
+    num_row_groups = pq.ParquetFile(source).num_row_groups
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, num_row_groups))
+    args = (column, fields, prefix, subdomain, format)
+
+    writer = None
+
+    def write(table):
+        nonlocal writer
+        if writer is None:
+            writer = pq.ParquetWriter(destination, table.schema)
+        writer.write_table(table, row_group_size=max(table.num_rows, 1))
+
+    try:
+        if max_workers == 1:
+            _init_worker(exclude_private_suffix, file_path)
+            for i in range(num_row_groups):
+                write(_transform_row_group(source, i, *args))
+        else:
+            with ProcessPoolExecutor(max_workers, initializer=_init_worker,
+                                     initargs=(exclude_private_suffix, file_path)) as executor:
+                pending = deque()
+                for i in range(num_row_groups):
+                    if len(pending) == max_workers:
+                        # Write the oldest row group before reading another one
+                        write(pending.popleft().result())
+                    pending.append(executor.submit(_transform_row_group, source, i, *args))
+                while pending:
+                    write(pending.popleft().result())
+        if writer is None:
+            # No row groups: write an empty file with the output schema
+            _init_worker(exclude_private_suffix, file_path)
+            write(enrich_table(pq.ParquetFile(source).schema_arrow.empty_table(),
+                               _worker_extractor, *args))
+    finally:
+        if writer is not None:
+            writer.close()
+    return num_row_groups
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Append FastTLDExtract result columns to a Parquet file.")
+    parser.add_argument("source", help="input Parquet file")
+    parser.add_argument("destination", help="output Parquet file")
+    parser.add_argument("--column", required=True, help="name of the URL column")
+    parser.add_argument("--fields", nargs="+", default=["domain_name", "suffix"],
+                        help="result fields to append (default: domain_name suffix)")
+    parser.add_argument("--prefix", default=None,
+                        help="prefix of the appended column names (default: COLUMN_)")
+    parser.add_argument("--no-subdomain", action="store_true", help="do not extract subdomains")
+    parser.add_argument("--format", action="store_true", help="format URLs to punycode")
+    parser.add_argument("--exclude-private-suffix", action="store_true",
+                        help="exclude private suffixes")
+    parser.add_argument("--file-path", default="", help="public suffix list file")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (default: number of CPUs)")
+    args = parser.parse_args(argv)
+    transform_parquet(args.source, args.destination, args.column, fields=args.fields,
+                      prefix=args.prefix, subdomain=not args.no_subdomain, format=args.format,
+                      exclude_private_suffix=args.exclude_private_suffix,
+                      file_path=args.file_path, max_workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,80 +8,188 @@
 Copyright (c) 2022 Wu Tingfeng
 Copyright (c) 2017-2018 Jophy
 """
+import json
 import os
 import os.path
+import tempfile
 import time
+from re import compile
+from unicodedata import normalize
+
+
+PRIVATE_SECTION_MARKER = "// ===BEGIN PRIVATE DOMAINS==="
+
+# The bundled list, updated by update() and auto_update()
+DEFAULT_FILE_PATH = os.path.dirname(os.path.realpath(__file__)) + "/public_suffix_list.dat"
+
+# Where update() downloads the list from, e.g. an internal mirror
+PSL_URL = os.environ.get("FASTTLD_PSL_URL", "https://publicsuffix.org/list/public_suffix_list.dat")
+
+# A downloaded list with fewer rules is rejected as truncated or not a public suffix list
+MIN_RULES = 1000
+
+# ETag and Last-Modified of the last download are kept in file_path + VALIDATORS_SUFFIX
+VALIDATORS_SUFFIX = ".validators.json"
+
+# Label separators other than "." and characters that nameprep maps to nothing (RFC 3454 B.1)
+IDNA_SLOW_PATH_RE = compile("[\u3002\uff0e\uff61\u00ad\u034f\u1806\u180b-\u180d"
+                            "\u200b-\u200d\u2060\ufe00-\ufe0f\ufeff]")
+
+
+def punycode(rule):
+    """
+    The punycode form of a non-ASCII rule, same as rule.encode('idna').
+    Labels that nameprep would leave unchanged, i.e. already case folded and NFKC normalized like
+    every rule in the public suffix list, are encoded directly with the punycode codec.
+    Any other rule goes through the much slower IDNA codec.
+    :return: str
+    """
+    labels = rule.split(".")
+    if not IDNA_SLOW_PATH_RE.search(rule):
+        for i, label in enumerate(labels):
+            if label.isascii():
+                continue
+            if label.casefold() != label or normalize("NFKC", label) != label:
+                break
+            labels[i] = "xn--" + label.encode("punycode").decode("ascii")
+            if len(labels[i]) > 63:
+                break
+        else:
+            return ".".join(labels)
+    return rule.encode('idna').decode('utf-8')
+
+
+def getPublicSuffixRules(file_path="", data=None):
+    """
+    Parse the public suffix list into a single list of rules, each tagged with its section.
+    The file is read in one go, and only non-ASCII rules are converted to punycode.
+    :param file_path: Public suffix list file. Defaults to the bundled list.
+    :param data: Contents of a public suffix list, as bytes or str, instead of reading file_path.
+    :return: List of (rule, private) in file order, where private is True for rules in the
+    private domains section (eg, blogspot.com). The punycode form of an IDN rule follows it.
+    """
+    if data is None:
+        if not file_path:
+            file_path = DEFAULT_FILE_PATH
+
+        if not os.path.isfile(file_path):
+            raise Exception("\rPath:" + file_path + " .\nPublic suffix list file not found.")
+
+        with open(file_path, 'rb') as fd:
+            data = fd.read()
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+
+    rules = []
+    append = rules.append
+    private = False
+    for line in data.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("//"):
+            if line == PRIVATE_SECTION_MARKER:
+                private = True
+            continue
+        append((line, private))
+        if not line.isascii():
+            punycode_suffix = punycode(line)
+            if punycode_suffix != line and punycode_suffix != "":
+                append((punycode_suffix, private))
+    return rules
 
 
 def getPublicSuffixList(file_path):
     """
     Get a suffix list with none private suffix list. (eg, blogspot.com)
+    Kept for compatibility, see getPublicSuffixRules.
     :return: Tuple()
     PublicSuffixList: The common domain suffix. Eg, com,net,org
     PrivateSuffixList: The suffixes including Private domains. Eg, blogspot.co.uk
     AllSuffixList: Including all suffix lists above.
     """
-    PublicSuffixList = list()
-    PrivateSuffixList = list()
-    AllSuffixList = list()
-    pri_flag = False
-    if not file_path:
-        file_path = os.path.dirname(os.path.realpath(__file__)) + '/public_suffix_list.dat'
+    AllSuffixList = getPublicSuffixRules(file_path)
+    PublicSuffixList = [rule for rule, private in AllSuffixList if not private]
+    PrivateSuffixList = [rule for rule, private in AllSuffixList if private]
+    return PublicSuffixList, PrivateSuffixList, [rule for rule, _ in AllSuffixList]
 
-    if not os.path.isfile(file_path):
-        raise Exception("\rPath:" + file_path + " .\nPublic suffix list file not found.")
 
+def _read_validators(path, url):
+    """ETag and Last-Modified saved by update() for url, or {}."""
     try:
-        fd = open(file_path, 'r', encoding='utf-8')
-    except Exception:
-        fd = open(file_path, 'r')
-    with fd:
-        suffix = punycode_suffix = ""
-        for line in fd:
-            line = line.strip()
-            if "// ===BEGIN PRIVATE DOMAINS===" == line:
-                pri_flag = True
-            if line == "":
-                continue
-            if line.startswith("//"):
-                continue
-            suffix = line
-            try:
-                punycode_suffix = line.encode('idna').decode('utf-8')  # python3
-            except Exception:
-                punycode_suffix = line.decode('utf-8').encode('idna')  # python2
-            if pri_flag:
-                PrivateSuffixList.append(suffix)
-                if punycode_suffix != suffix and punycode_suffix != "":
-                    PrivateSuffixList.append(punycode_suffix)
-            else:
-                PublicSuffixList.append(suffix)
-                if punycode_suffix != suffix and punycode_suffix != "":
-                    PublicSuffixList.append(punycode_suffix)
-            AllSuffixList.append(suffix)
-            if punycode_suffix != suffix and punycode_suffix != "":
-                AllSuffixList.append(punycode_suffix)
-    return PublicSuffixList, PrivateSuffixList, AllSuffixList
-
-
-def update(show_output=True):
+        with open(path, encoding="utf-8") as f:
+            validators = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return validators if validators.get("url") == url else {}
+
+
+def update(show_output=True, url=None, file_path="", min_rules=MIN_RULES, timeout=60):
     """
     Update Public Suffix List from https://publicsuffix.org/list/public_suffix_list.dat
-    :return:
+    The request is conditional on the ETag and Last-Modified of the previous download, so an
+    unchanged list is not downloaded again. A new list is written to a temporary file, checked,
+    and renamed over file_path, so readers never see a partially written file.
+    :param show_output: Print the outcome.
+    :param url: URL of the list. Defaults to PSL_URL, set by the FASTTLD_PSL_URL environment
+    variable.
+    :param file_path: File to update. Defaults to the bundled list.
+    :param min_rules: Reject a downloaded list with fewer rules.
+    :param timeout: Seconds to wait for the server.
+    :return: True if the list was downloaded, False if it was not modified.
     """
     try:
-        file_path = os.path.dirname(os.path.realpath(__file__)) + "/public_suffix_list.dat"
-        base_url = 'https://publicsuffix.org/list/public_suffix_list.dat'
+        import urllib.error
+        import urllib.request
+        if not file_path:
+            file_path = DEFAULT_FILE_PATH
+        url = url or PSL_URL
+        validators_path = file_path + VALIDATORS_SUFFIX
+        headers = {}
+        if os.path.isfile(file_path):
+            validators = _read_validators(validators_path, url)
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, headers=headers),
+                                        timeout=timeout) as response:
+                data = response.read()
+                validators = {"url": url, "etag": response.headers.get("ETag"),
+                              "last_modified": response.headers.get("Last-Modified")}
+        except urllib.error.HTTPError as e:
+            if e.code != 304:
+                raise
+            # Not modified, only restart the auto_update() clock
+            os.utime(file_path)
+            if show_output:
+                print('The public suffix list is already up to date.\nThe file path is:')
+                print(file_path)
+            return False
+
+        rules = getPublicSuffixRules(data=data)
+        if len(rules) < min_rules:
+            raise Exception("%s has only %d rules, expected at least %d"
+                            % (url, len(rules), min_rules))
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)),
+                                        prefix=".public_suffix_list.")
         try:
-            import urllib
-            downfile = urllib.URLopener()
-            downfile.retrieve(base_url, file_path)
-        except Exception:
-            import urllib.request
-            urllib.request.urlretrieve(base_url, file_path)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            # mkstemp() files are only readable by their owner
+            os.chmod(tmp_path, os.stat(file_path).st_mode & 0o777
+                     if os.path.isfile(file_path) else 0o644)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        with open(validators_path, "w", encoding="utf-8") as f:
+            json.dump(validators, f)
         if show_output:
             print('Already updated the public suffix list.\nThe file path is:')
             print(file_path)
+        return True
     except Exception as e:
         raise Exception('[+]PSL UPDATES Error:' + str(e))
 
@@ -95,7 +203,7 @@ def auto_update():
     if os.environ.get("FASTTLD_NO_AUTO_UPDATE") == "1":
         return
     need_update = False
-    file_path = os.path.dirname(os.path.realpath(__file__)) + "/public_suffix_list.dat"
+    file_path = DEFAULT_FILE_PATH
     if os.path.isfile(file_path):
         # updates in 3 days
         if (time.time() - os.path.getmtime(file_path))/3600/24 > 3:
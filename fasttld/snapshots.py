@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Dated snapshots of the public suffix list, to split historical URLs with the list as it was
+at the time, e.g. when reprocessing old logs.
+
+Each snapshot is derived from its nearest neighbour with FastTLDExtract.reload(), so the
+sub-tries of TLDs whose rules did not change are shared between snapshots. Within the TLDs that
+were rebuilt, nodes equal to those of the neighbour are shared too, so memory grows with the
+differences between snapshots rather than with their number.
+
+>>> from datetime import date
+>>> from fasttld.snapshots import SnapshotStore
+>>> store = SnapshotStore()
+>>> store.add(date(2023, 1, 1), "psl-2023-01-01.dat")
+>>> store.add(date(2024, 1, 1), "psl-2024-01-01.dat")
+>>> store.extract("www.example.co.uk", as_of=date(2023, 6, 1))
+
+@author: Wu Tingfeng
+@file: snapshots.py
+
+Copyright (c) 2022 Wu Tingfeng
+"""
+from bisect import bisect_right, insort
+from threading import Lock
+
+from fasttld.FastTLDExtract import FastTLDExtract
+
+
+def share_nodes(node, base):
+    """
+    Replace the children of a trie node that are equal to the children of base by those of
+    base, recursively, so that two tries share them.
+    :param node: Trie node to update, not yet visible to lookups.
+    :param base: Trie node of the same path in another trie.
+    :return:
+    """
+    for key, child in node.items():
+        base_child = base.get(key)
+        if base_child is None or base_child is child or child is True:
+            continue
+        if child == base_child:
+            node[key] = base_child
+        elif isinstance(child, dict) and isinstance(base_child, dict):
+            share_nodes(child, base_child)
+
+
+class SnapshotStore(object):
+    def __init__(self, exclude_private_suffix=False, lazy=False):
+        """
+        :param exclude_private_suffix: Exclude private section rules from every snapshot.
+        :param lazy: Build the sub-trie of a TLD on first use, see FastTLDExtract(lazy=...).
+        """
+        self.exclude_private_suffix = exclude_private_suffix
+        self.lazy = lazy
+        self._dates = []
+        self._snapshots = {}
+        self._lock = Lock()
+
+    def add(self, as_of, file_path="", data=None):
+        """
+        Add the public suffix list in effect from as_of onwards.
+        :param as_of: Date (or any comparable value, e.g. datetime) the snapshot takes effect.
+        :param file_path: Public suffix list file of the snapshot.
+        :param data: Contents of the public suffix list, as bytes or str, instead of file_path.
+        :return: dict from FastTLDExtract.reload() of the rules that differ from the snapshot it
+        was derived from, or None for the first snapshot.
+        """
+        with self._lock:
+            if not self._dates:
+                snapshot = FastTLDExtract(exclude_private_suffix=self.exclude_private_suffix,
+                                          file_path=file_path, lazy=self.lazy, data=data)
+                diff = None
+            else:
+                snapshot, diff = self._derive(self._nearest(as_of), file_path, data)
+            # snapshot() reads without the lock, so a date must never be listed before its
+            # snapshot is stored
+            self._snapshots[as_of] = snapshot
+            if as_of not in self._dates:
+                insort(self._dates, as_of)
+        return diff
+
+    def _nearest(self, as_of):
+        """Snapshot dated closest before as_of, else the earliest one."""
+        i = bisect_right(self._dates, as_of)
+        return self._snapshots[self._dates[max(i - 1, 0)]]
+
+    @staticmethod
+    def _derive(base, file_path, data):
+        """
+        Clone base and reload() the clone with another public suffix list. The clone gets a new
+        trie root, which shares the sub-tries of unchanged TLDs with base.
+        :return: (snapshot, diff)
+        """
+        snapshot = base.clone(file_path)
+        diff = snapshot.reload(data)
+        for tld in diff["tlds"]:
+            # get() does not build the sub-trie of a TLD pending in a lazy trie
+            node, base_node = snapshot.trie.get(tld), base.trie.get(tld)
+            if isinstance(node, dict) and isinstance(base_node, dict):
+                share_nodes(node, base_node)
+        return snapshot, diff
+
+    def dates(self):
+        """:return: Sorted list of snapshot dates"""
+        return list(self._dates)
+
+    def snapshot(self, as_of=None):
+        """
+        :param as_of: Date to look up, None for the latest snapshot.
+        :return: FastTLDExtract of the latest snapshot dated on or before as_of.
+        """
+        dates = self._dates
+        if not dates:
+            raise Exception("No public suffix list snapshots, see SnapshotStore.add()")
+        if as_of is None:
+            return self._snapshots[dates[-1]]
+        i = bisect_right(dates, as_of)
+        if not i:
+            raise Exception("No public suffix list snapshot as of %s, the earliest is from %s"
+                            % (as_of, dates[0]))
+        return self._snapshots[dates[i - 1]]
+
+    def extract(self, raw_url, as_of=None, **kwargs):
+        """
+        FastTLDExtract.extract() with the snapshot in effect at as_of, see snapshot().
+        :param raw_url: URL to extract.
+        :param as_of: Date of the URL, None for the latest snapshot.
+        :param kwargs: Other arguments of FastTLDExtract.extract().
+        :return: TLDResult
+        """
+        return self.snapshot(as_of).extract(raw_url, **kwargs)
+
+    def extract_batch(self, raw_urls, as_of=None, **kwargs):
+        """FastTLDExtract.extract_batch() with the snapshot in effect at as_of."""
+        return self.snapshot(as_of).extract_batch(raw_urls, **kwargs)
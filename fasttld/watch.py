@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Poll a file for changes in a background thread, see FastTLDExtract.watch().
+
+@author: Wu Tingfeng
+@file: watch.py
+
+Copyright (c) 2022 Wu Tingfeng
+"""
+import os
+from threading import Event, Thread
+
+
+def file_signature(path):
+    """:return: (mtime_ns, inode, device, size) of path, or None if it does not exist"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_ino, st.st_dev, st.st_size
+
+
+class FileWatcher(object):
+    """
+    Daemon thread calling on_change() once the mtime, inode or size of a file has changed and
+    then stayed the same for one more poll. This covers files replaced by a rename as well as
+    files rewritten in place, which are left alone while they keep changing.
+    """
+
+    def __init__(self, path, on_change, interval=5.0):
+        """
+        :param path: File to watch.
+        :param on_change: Called without arguments from the watcher thread. If it raises, e.g.
+        on a list that is too short, the exception is kept in error and on_change() is retried
+        at every poll until it succeeds.
+        :param interval: Seconds between polls.
+        """
+        if interval <= 0:
+            raise Exception("interval must be positive")
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.error = None
+        self._signature = file_signature(path)
+        # Signature seen at the last poll, if it differed from _signature
+        self._candidate = None
+        self._stop = Event()
+        self._thread = Thread(target=self._run, name="fasttld-watch", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def poll(self):
+        """
+        Check the file once, as the watcher thread does every interval seconds.
+        :return: Whether on_change() was called and succeeded.
+        """
+        signature = file_signature(self.path)
+        # A missing file is usually being replaced, wait for the new one
+        if signature is None or signature == self._signature:
+            self._candidate = None
+            return False
+        if signature != self._candidate:
+            # Changed since the last poll, wait until it stops changing
+            self._candidate = signature
+            return False
+        try:
+            self.on_change()
+        except Exception as e:
+            self.error = e
+            return False
+        self.error = None
+        self._signature = signature
+        return True
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def stop(self, timeout=None):
+        """Stop polling and wait for the watcher thread to exit."""
+        self._stop.set()
+        self._thread.join(timeout)
@@ -38,20 +38,15 @@ setup(
                 'structure implemented with the builtin python dict().',
     include_package_data=True,
     zip_safe=False,
+    python_requires='>=3.7',
     install_requires=['idna', 'setuptools'],
+    extras_require={'arrow': ['pyarrow'], 'pandas': ['pandas']},
     test_suite='setup.test_suite',
     classifiers=[
         "Development Status :: 5 - Production/Stable",
         "Topic :: Utilities",
         "License :: OSI Approved :: MIT License",
-        "Programming Language :: Python :: 2",
-        "Programming Language :: Python :: 2.6",
-        "Programming Language :: Python :: 2.7",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.3",
-        "Programming Language :: Python :: 3.4",
-        "Programming Language :: Python :: 3.5",
-        "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: 3.8",
         "Programming Language :: Python :: 3.9",
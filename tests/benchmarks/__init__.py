@@ -0,0 +1,14 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark suite for fasttld.
+
+$ python -m tests.benchmarks throughput --json results.json
+$ python -m tests.benchmarks compare before.json after.json
+
+@author: Wu Tingfeng
+@file: __init__.py
+
+Copyright (c) 2022 Wu Tingfeng
+"""
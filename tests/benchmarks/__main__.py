@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Command line entry point of the benchmark suite.
+
+@author: Wu Tingfeng
+@file: __main__.py
+
+Copyright (c) 2022 Wu Tingfeng
+"""
+import argparse
+import sys
+from collections import Counter
+
+from tests.benchmarks.common import load_json, write_json
+from tests.benchmarks.corpora import CORPORA
+
+
+def synthetic_corpora(size, seed):
+    from tests.benchmarks.synthetic import CorpusGenerator
+    gen = CorpusGenerator(seed=seed)
+    corpora = dict(("synthetic_" + rule_type, urls)
+                   for rule_type, urls in gen.by_rule_type(size).items())
+    corpora["synthetic_zipf"] = gen.generate(size)
+    return corpora
+
+
+def select_corpora(args):
+    corpora = synthetic_corpora(args.synthetic, args.seed) if args.synthetic else CORPORA
+    if not args.corpus:
+        return corpora
+    unknown = [name for name in args.corpus if name not in corpora]
+    if unknown:
+        sys.exit("Unknown corpus: %s (choose from %s)" % (", ".join(unknown), ", ".join(corpora)))
+    return dict((name, corpora[name]) for name in args.corpus)
+
+
+def write_corpus(path, size, seed):
+    from tests.benchmarks.synthetic import CorpusGenerator
+    urls = CorpusGenerator(seed=seed).generate(size)
+    with open(path, "w", encoding="utf-8") as f:
+        for url in urls:
+            f.write(url + "\n")
+    counts = sorted(Counter(urls).values(), reverse=True)
+    top = max(1, len(counts) // 100)
+    print("%d URLs, %d distinct, top 1%% of distinct URLs are %.1f%% of traffic" % (
+        len(urls), len(counts), 100.0 * sum(counts[:top]) / len(urls)))
+
+
+# Scalar metrics compared between runs, besides ops_per_sec
+COMPARED_METRICS = ("peak_bytes", "retained_bytes", "peak_bytes_per_call", "import_seconds",
+                    "parse_seconds", "build_seconds", "first_extract_seconds", "total_seconds",
+                    "p50_ns", "p90_ns", "p99_ns", "p99.9_ns", "max_ns", "efficiency",
+                    "startup_seconds", "worker_max_rss_bytes", "process_rss_bytes")
+
+
+def compare(before_path, after_path):
+    before = dict((r["name"], r) for r in load_json(before_path)["results"])
+    after = dict((r["name"], r) for r in load_json(after_path)["results"])
+    print("%-64s %14s %14s %8s" % ("benchmark", "before", "after", "change"))
+    for name, result in after.items():
+        if name not in before:
+            continue
+        if "ops_per_sec" in result:
+            old = before[name]["ops_per_sec"]["mean"]
+            new = result["ops_per_sec"]["mean"]
+            old_ci, new_ci = before[name]["ops_per_sec"]["ci95"], result["ops_per_sec"]["ci95"]
+            # Overlapping confidence intervals are not a significant change
+            overlap = new_ci[0] <= old_ci[1] and old_ci[0] <= new_ci[1]
+            print("%-64s %14.0f %14.0f %+7.1f%%%s" % (name + " ops/s", old, new,
+                                                      (new / old - 1) * 100,
+                                                      "" if overlap else " *"))
+        for metric in COMPARED_METRICS:
+            if metric in result and metric in before[name]:
+                old, new = before[name][metric], result[metric]
+                if old is None or new is None:
+                    continue
+                change = (float(new) / old - 1) * 100 if old else 0.0
+                print("%-64s %14.6g %14.6g %+7.1f%%" % (name + " " + metric, old, new, change))
+    print("* 95% confidence intervals do not overlap")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tests.benchmarks",
+                                     description="fasttld benchmark suite")
+    subparsers = parser.add_subparsers(dest="benchmark")
+
+    def add_parser(name, help, timed=True):
+        sub = subparsers.add_parser(name, help=help)
+        sub.add_argument("--json", metavar="PATH", help="write results to a JSON file")
+        sub.add_argument("--corpus", nargs="+", metavar="NAME",
+                         help="corpora to run (default: all of %s)" % ", ".join(CORPORA))
+        sub.add_argument("--synthetic", type=int, metavar="N",
+                         help="use synthetic corpora of N URLs per rule type, plus a "
+                              "Zipf-distributed corpus of N URLs, instead of the default corpora")
+        sub.add_argument("--seed", type=int, default=0, help="seed of the synthetic corpora")
+        if timed:
+            sub.add_argument("--repeat", type=int, default=10, help="timed runs (default: 10)")
+            sub.add_argument("--warmup", type=int, default=1, help="untimed runs (default: 1)")
+        return sub
+
+    sub = add_parser("throughput", "operations per second of extract on each corpus")
+    sub.add_argument("--number", type=int, default=1000,
+                     help="passes over the corpus per run (default: 1000)")
+    sub.add_argument("--compare", action="store_true",
+                     help="also run tldextract and tld when they are installed")
+    sub.add_argument("--include-private-suffix", action="store_true",
+                     help="construct FastTLDExtract with exclude_private_suffix=False")
+
+    sub = add_parser("latency", "p50, p90, p99 and p99.9 latency of single extract calls on each "
+                                "corpus", timed=False)
+    sub.add_argument("--number", type=int, default=100,
+                     help="passes over the corpus (default: 100)")
+    sub.add_argument("--warmup", type=int, default=1, help="untimed passes (default: 1)")
+    sub.add_argument("--histogram", action="store_true", help="print HDR-style histograms")
+    sub.add_argument("--include-private-suffix", action="store_true",
+                     help="construct FastTLDExtract with exclude_private_suffix=False")
+
+    sub = add_parser("memory", "tracemalloc peak and retained memory of construction and extract",
+                     timed=False)
+    sub.add_argument("--number", type=int, default=100,
+                     help="passes over the corpus when checking retained memory (default: 100)")
+
+    sub = subparsers.add_parser("startup", help="import, parse, build and first extract time, "
+                                                "each run in a fresh interpreter")
+    sub.add_argument("--json", metavar="PATH", help="write results to a JSON file")
+    sub.add_argument("--repeat", type=int, default=10, help="fresh interpreters (default: 10)")
+    sub.add_argument("--warmup", type=int, default=1, help="untimed runs (default: 1)")
+
+    sub = subparsers.add_parser("file",
+                                help="extract_file versus extracting each line of open(...)")
+    sub.add_argument("--json", metavar="PATH", help="write results to a JSON file")
+    sub.add_argument("--repeat", type=int, default=5, help="timed runs (default: 5)")
+    sub.add_argument("--warmup", type=int, default=1, help="untimed runs (default: 1)")
+    sub.add_argument("--lines", type=int, default=1000000,
+                     help="synthetic Zipf-distributed URLs in the file (default: 1000000)")
+    sub.add_argument("--seed", type=int, default=0, help="seed of the synthetic corpus")
+
+    sub = subparsers.add_parser("scaling", help="threads versus processes with 1, 2, 4, 8, ... "
+                                                "workers over a synthetic corpus")
+    sub.add_argument("--json", metavar="PATH", help="write results to a JSON file")
+    sub.add_argument("--repeat", type=int, default=5, help="timed runs (default: 5)")
+    sub.add_argument("--urls", type=int, default=200000,
+                     help="synthetic Zipf-distributed URLs in the corpus (default: 200000)")
+    sub.add_argument("--seed", type=int, default=0, help="seed of the synthetic corpus")
+    sub.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8],
+                     help="worker counts (default: 1 2 4 8)")
+    sub.add_argument("--chunk-size", type=int, default=5000,
+                     help="URLs per task (default: 5000)")
+
+    sub = subparsers.add_parser("corpus", help="write a synthetic Zipf-distributed corpus")
+    sub.add_argument("path", help="output file, one URL per line")
+    sub.add_argument("--size", type=int, default=1000000, help="number of URLs")
+    sub.add_argument("--seed", type=int, default=0, help="seed of the synthetic corpus")
+
+    sub = subparsers.add_parser("compare", help="compare two JSON result files")
+    sub.add_argument("before")
+    sub.add_argument("after")
+
+    args = parser.parse_args(argv)
+    if args.benchmark is None:
+        parser.print_help()
+        return
+    if args.benchmark == "compare":
+        compare(args.before, args.after)
+        return
+    if args.benchmark == "corpus":
+        write_corpus(args.path, args.size, args.seed)
+        return
+
+    if args.benchmark == "file":
+        from tests.benchmarks import file
+        results = file.run(num_lines=args.lines, seed=args.seed, repeat=args.repeat,
+                           warmup=args.warmup)
+    elif args.benchmark == "throughput":
+        corpora = select_corpora(args)
+        from tests.benchmarks import throughput
+        results = throughput.run(corpora, number=args.number, repeat=args.repeat,
+                                 warmup=args.warmup, compare=args.compare,
+                                 exclude_private_suffix=not args.include_private_suffix)
+    elif args.benchmark == "latency":
+        from tests.benchmarks import latency
+        results = latency.run(select_corpora(args), number=args.number, warmup=args.warmup,
+                              exclude_private_suffix=not args.include_private_suffix,
+                              show_histogram=args.histogram)
+    elif args.benchmark == "scaling":
+        from tests.benchmarks import scaling
+        results = scaling.run(num_urls=args.urls, seed=args.seed, workers=args.workers,
+                              chunk_size=args.chunk_size, repeat=args.repeat)
+    elif args.benchmark == "startup":
+        from tests.benchmarks import startup
+        results = startup.run(repeat=args.repeat, warmup=args.warmup)
+    elif args.benchmark == "memory":
+        from tests.benchmarks import memory
+        results = memory.run(select_corpora(args), number=args.number)
+
+    if args.json:
+        write_json(args.json, args.benchmark, results)
+
+
+if __name__ == "__main__":
+    main()
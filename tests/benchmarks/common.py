@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Timing, statistics and JSON helpers shared by the benchmarks.
+
+@author: Wu Tingfeng
+@file: common.py
+
+Copyright (c) 2022 Wu Tingfeng
+"""
+import json
+import math
+import os
+import platform
+import sys
+import time
+import timeit
+
+# Two-sided 95% Student's t critical values, by degrees of freedom
+T_95 = {
+    1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+    10: 2.228, 11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145, 15: 2.131, 16: 2.120, 17: 2.110,
+    18: 2.101, 19: 2.093, 20: 2.086, 25: 2.060, 30: 2.042, 40: 2.021, 60: 2.000, 120: 1.980,
+}
+
+
+def t_critical(df):
+    for key in sorted(T_95):
+        if df <= key:
+            return T_95[key]
+    return 1.960
+
+
+def summarize(samples):
+    """
+    Mean, sample standard deviation and 95% confidence interval of samples.
+    :return: dict
+    """
+    n = len(samples)
+    mean = sum(samples) / n
+    stdev = math.sqrt(sum((x - mean) ** 2 for x in samples) / (n - 1)) if n > 1 else 0.0
+    half_width = t_critical(n - 1) * stdev / math.sqrt(n) if n > 1 else 0.0
+    return {
+        "mean": mean,
+        "stdev": stdev,
+        "ci95": [mean - half_width, mean + half_width],
+        "samples": samples,
+    }
+
+
+def measure_ops(func, inputs, kwargs=None, number=1000, repeat=10, warmup=1):
+    """
+    Time func over every input, number times per run.
+    :param func: Callable, called as func(input, **kwargs).
+    :param inputs: List of inputs.
+    :param number: Passes over inputs per run.
+    :param repeat: Number of timed runs.
+    :param warmup: Number of untimed runs beforehand.
+    :return: summarize() of operations per second of each run.
+    """
+    kwargs = kwargs or {}
+
+    def run():
+        for inp in inputs:
+            func(inp, **kwargs)
+
+    timer = timeit.Timer(run)
+    if warmup:
+        timer.repeat(repeat=warmup, number=number)
+    times = timer.repeat(repeat=repeat, number=number)
+    return summarize([number * len(inputs) / t for t in times])
+
+
+def format_ops(summary):
+    low, high = summary["ci95"]
+    return "%12.0f ops/s  (95%% CI %.0f - %.0f)" % (summary["mean"], low, high)
+
+
+def metadata():
+    import fasttld
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version,
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "fasttld": os.path.dirname(os.path.realpath(fasttld.__file__)),
+    }
+
+
+def write_json(path, benchmark, results):
+    """
+    Write benchmark results and run metadata to a JSON file.
+    :param benchmark: Name of the benchmark.
+    :param results: List of dicts, each with a unique "name".
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"benchmark": benchmark, "metadata": metadata(), "results": results},
+                  f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+def load_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+FastTLDExtract.extract_file versus extracting each line of open(...).
+
+@author: Wu Tingfeng
+@file: file.py
+
+Copyright (c) 2022 Wu Tingfeng
+"""
+import os
+import tempfile
+import time
+
+from fasttld import FastTLDExtract
+from tests.benchmarks.common import format_ops, summarize
+from tests.benchmarks.synthetic import CorpusGenerator
+
+
+def run(num_lines=1000000, seed=0, repeat=5, warmup=1):
+    t = FastTLDExtract(exclude_private_suffix=True)
+
+    def open_lines(path):
+        with open(path, encoding="utf-8") as fd:
+            for line in fd:
+                t.extract(line)
+
+    def extract_file(path):
+        for _ in t.extract_file(path):
+            pass
+
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as f:
+        for url in CorpusGenerator(seed=seed).generate(num_lines):
+            f.write(url + "\n")
+    results = []
+    try:
+        for name, func in (("for_line_in_open", open_lines), ("extract_file", extract_file)):
+            for _ in range(warmup):
+                func(f.name)
+            samples = []
+            for _ in range(repeat):
+                t1 = time.perf_counter()
+                func(f.name)
+                samples.append(num_lines / (time.perf_counter() - t1))
+            summary = summarize(samples)
+            print("%-28s %d lines %s" % (name, num_lines, format_ops(summary)))
+            results.append({"name": name, "lines": num_lines, "ops_per_sec": summary})
+    finally:
+        os.remove(f.name)
+    return results
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Latency percentiles of individual FastTLDExtract.extract calls on each corpus,
+with HDR-style log-linear histograms, to catch tail regressions that throughput averages hide.
+
+@author: Wu Tingfeng
+@file: latency.py
+
+Copyright (c) 2022 Wu Tingfeng
+"""
+import gc
+from time import perf_counter_ns
+
+from fasttld import FastTLDExtract
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+# Linear sub-buckets per power of two, i.e. values are bucketed with at most 12.5% error
+SUB_BUCKETS = 8
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile p (0 - 100) of a sorted list."""
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def bucket_upper_bound(ns):
+    """Upper bound of the log-linear histogram bucket of a value in nanoseconds."""
+    if ns < SUB_BUCKETS:
+        return ns
+    width = 1 << (ns.bit_length() - SUB_BUCKETS.bit_length())
+    return (ns // width + 1) * width - 1
+
+
+def histogram(values):
+    """
+    HDR-style histogram: every power of two split into SUB_BUCKETS linear buckets.
+    :return: List of [upper bound in nanoseconds, count, cumulative fraction] of non-empty buckets.
+    """
+    counts = {}
+    for ns in values:
+        bound = bucket_upper_bound(ns)
+        counts[bound] = counts.get(bound, 0) + 1
+    buckets = []
+    cumulative = 0
+    for bound in sorted(counts):
+        cumulative += counts[bound]
+        buckets.append([bound, counts[bound], float(cumulative) / len(values)])
+    return buckets
+
+
+def timer_overhead_ns(samples=100000):
+    """Median duration of an empty perf_counter_ns() pair, included in every measurement."""
+    durations = []
+    for _ in range(samples):
+        start = perf_counter_ns()
+        durations.append(perf_counter_ns() - start)
+    durations.sort()
+    return durations[len(durations) // 2]
+
+
+def measure_calls(func, urls, kwargs, number=100, warmup=1):
+    """
+    Duration of every func(url, **kwargs) call over number passes, with garbage collection
+    disabled as in timeit.
+    :return: List of nanoseconds
+    """
+    for _ in range(warmup):
+        for url in urls:
+            func(url, **kwargs)
+    durations = []
+    append = durations.append
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(number):
+            for url in urls:
+                start = perf_counter_ns()
+                func(url, **kwargs)
+                append(perf_counter_ns() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return durations
+
+
+def print_histogram(buckets, width=50):
+    peak = max(count for _, count, _ in buckets)
+    for bound, count, cumulative in buckets:
+        bar = "#" * max(1, width * count // peak)
+        print("    <= %9d ns %10d  %8.4f%%  %s" % (bound, count, cumulative * 100, bar))
+
+
+def run(corpora, number=100, warmup=1, exclude_private_suffix=True, show_histogram=False):
+    t = FastTLDExtract(exclude_private_suffix=exclude_private_suffix)
+    overhead = timer_overhead_ns()
+    print("timer overhead %d ns per call, included below" % overhead)
+    print("%-28s %-20s %9s %9s %9s %9s %9s" % ("", "", "p50 ns", "p90 ns", "p99 ns", "p99.9 ns",
+                                               "max ns"))
+    results = []
+    for module, kwargs in (("fasttld_with_subdomains", {"subdomain": True}),
+                           ("fasttld_without_subdomains", {"subdomain": False})):
+        for corpus_name, urls in corpora.items():
+            durations = sorted(measure_calls(t.extract, urls, kwargs, number, warmup))
+            result = {
+                "name": "%s/%s" % (module, corpus_name),
+                "module": module,
+                "corpus": corpus_name,
+                "calls": len(durations),
+                "timer_overhead_ns": overhead,
+            }
+            for p in PERCENTILES:
+                result["p%s_ns" % p] = percentile(durations, p)
+            result["max_ns"] = durations[-1]
+            result["histogram"] = histogram(durations)
+            print("%-28s %-20s %9d %9d %9d %9d %9d" % (
+                module, corpus_name, result["p50_ns"], result["p90_ns"], result["p99_ns"],
+                result["p99.9_ns"], result["max_ns"]))
+            if show_histogram:
+                print_histogram(result["histogram"])
+            results.append(result)
+    return results
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Memory footprint of FastTLDExtract, measured with tracemalloc:
+peak and retained memory of trie construction in a fresh interpreter, and transient and retained
+allocations of extract calls on each corpus.
+
+@author: Wu Tingfeng
+@file: memory.py
+
+Copyright (c) 2022 Wu Tingfeng
+"""
+import gc
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+
+from fasttld import FastTLDExtract
+
+
+CONSTRUCTION_CODE = """
+import gc, json, sys, tracemalloc
+from fasttld import FastTLDExtract
+"a".encode("idna")  # import the codec before measuring
+gc.collect()
+tracemalloc.start()
+t = FastTLDExtract(exclude_private_suffix=%s)
+gc.collect()
+retained, peak = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+json.dump({"peak_bytes": peak, "retained_bytes": retained}, sys.stdout)
+"""
+
+
+def construction(exclude_private_suffix):
+    """Peak and retained memory of constructing FastTLDExtract in a fresh interpreter."""
+    env = dict(os.environ, FASTTLD_NO_AUTO_UPDATE="1")
+    out = subprocess.run([sys.executable, "-c", CONSTRUCTION_CODE % exclude_private_suffix],
+                         env=env, check=True, stdout=subprocess.PIPE).stdout
+    return json.loads(out)
+
+
+def extract_allocations(t, urls, number):
+    """
+    Mean peak of transient allocations per extract call, and bytes
+    still allocated after number passes over urls (should stay near zero).
+    """
+    for url in urls:
+        t.extract(url)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        peaks = 0
+        for url in urls:
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            else:
+                # Python < 3.9: forgetting the traced blocks resets the peak too
+                tracemalloc.clear_traces()
+            before = tracemalloc.get_traced_memory()[0]
+            t.extract(url)
+            peaks += tracemalloc.get_traced_memory()[1] - before
+        baseline = tracemalloc.get_traced_memory()[0]
+        for _ in range(number):
+            for url in urls:
+                t.extract(url)
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    return {"peak_bytes_per_call": float(peaks) / len(urls), "retained_bytes": retained}
+
+
+def run(corpora, number=100):
+    results = []
+    extractors = []
+    for exclude_private_suffix in (True, False):
+        measured = construction(exclude_private_suffix)
+        t = FastTLDExtract(exclude_private_suffix=exclude_private_suffix)
+        extractors.append((exclude_private_suffix, t))
+        name = "construction/exclude_private_suffix=%s" % exclude_private_suffix
+        report = t.memory_report()
+        print("%-44s peak %10d B  retained %10d B  trie %10d B (%d nodes, %d leaves, "
+              "interning saves %d B)" % (name, measured["peak_bytes"], measured["retained_bytes"],
+                                         report["total_bytes"], report["nodes"], report["leaves"],
+                                         report["interning_savings_bytes"]))
+        results.append(dict(name=name, memory_report=report, **measured))
+
+    # Allocations depend on the trie walked, so measure both instances
+    pairs = itertools.product(extractors, corpora.items())
+    for (exclude_private_suffix, t), (corpus_name, urls) in pairs:
+        measured = extract_allocations(t, urls, number)
+        name = "extract/%s/exclude_private_suffix=%s" % (corpus_name, exclude_private_suffix)
+        print("%-60s peak %10.0f B/call  retained after %d passes %d B" % (
+            name, measured["peak_bytes_per_call"], number, measured["retained_bytes"]))
+        results.append(dict(name=name, **measured))
+    return results
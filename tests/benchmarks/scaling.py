@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Multi-core scaling of extraction over a fixed synthetic corpus with 1, 2, 4, 8, ... workers:
+per-URL extract in a thread pool sharing one FastTLDExtract, versus process-pool fan-out of
+chunks to extract_batch, each worker building its own trie, with and without sending the results
+back (i.e. with and without pickling them).
+
+@author: Wu Tingfeng
+@file: scaling.py
+
+Copyright (c) 2022 Wu Tingfeng
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from fasttld import FastTLDExtract
+from tests.benchmarks.common import format_ops, summarize
+from tests.benchmarks.synthetic import CorpusGenerator
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MODES = ("threads", "processes", "processes_no_results")
+
+_worker_extractor = None
+
+
+def max_rss_bytes():
+    """Peak resident set size of this process, or None where unavailable."""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def rss_bytes():
+    """Current resident set size of this process, or None where unavailable (not Linux)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _init_worker(exclude_private_suffix):
+    global _worker_extractor
+    _worker_extractor = FastTLDExtract(exclude_private_suffix=exclude_private_suffix)
+
+
+def _extract_chunk(urls):
+    return _worker_extractor.extract_batch(urls), max_rss_bytes()
+
+
+def _count_chunk(urls):
+    return len(_worker_extractor.extract_batch(urls)), max_rss_bytes()
+
+
+def chunks(urls, chunk_size):
+    return [urls[i:i + chunk_size] for i in range(0, len(urls), chunk_size)]
+
+
+def run_threads(t, urls, workers, chunk_size):
+    def extract_chunk(chunk):
+        extract = t.extract
+        return [extract(url) for url in chunk]
+
+    with ThreadPoolExecutor(workers) as executor:
+        for _ in executor.map(extract_chunk, chunks(urls, chunk_size)):
+            pass
+
+
+def run_processes(executor, urls, chunk_size, func):
+    """:return: Peak RSS reported by each chunk."""
+    return [rss for _, rss in executor.map(func, chunks(urls, chunk_size))]
+
+
+def measure(mode, urls, workers, chunk_size, repeat, exclude_private_suffix):
+    """
+    :return: dict(ops_per_sec=summarize() of warm runs, startup_seconds=pool startup
+    and first run minus a warm run, worker_max_rss_bytes=largest peak RSS reported by a worker
+    process, process_rss_bytes=RSS of this process after the runs). Threads share this process,
+    so only process_rss_bytes is set for them, and only worker_max_rss_bytes for processes.
+    """
+    if repeat < 1:
+        raise Exception("repeat must be at least 1")
+    samples = []
+    worker_rss = process_rss = None
+    if mode == "threads":
+        t = FastTLDExtract(exclude_private_suffix=exclude_private_suffix)
+        start = time.perf_counter()
+        run_threads(t, urls, workers, chunk_size)
+        cold = time.perf_counter() - start
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run_threads(t, urls, workers, chunk_size)
+            samples.append(time.perf_counter() - start)
+        # Threads share the trie and the process, which also holds the corpus
+        process_rss = rss_bytes()
+    else:
+        func = _extract_chunk if mode == "processes" else _count_chunk
+        start = time.perf_counter()
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(exclude_private_suffix,)) as executor:
+            rss_samples = run_processes(executor, urls, chunk_size, func)
+            cold = time.perf_counter() - start
+            for _ in range(repeat):
+                start = time.perf_counter()
+                rss_samples += run_processes(executor, urls, chunk_size, func)
+                samples.append(time.perf_counter() - start)
+        if None not in rss_samples:
+            worker_rss = max(rss_samples)
+    return {
+        "ops_per_sec": summarize([len(urls) / s for s in samples]),
+        "startup_seconds": max(0.0, cold - min(samples)),
+        "worker_max_rss_bytes": worker_rss,
+        "process_rss_bytes": process_rss,
+    }
+
+
+def run(num_urls=200000, seed=0, workers=(1, 2, 4, 8), chunk_size=5000, repeat=5,
+        exclude_private_suffix=True):
+    urls = CorpusGenerator(seed=seed).generate(num_urls)
+    results = []
+    for mode in MODES:
+        baseline = None
+        for n in workers:
+            measured = measure(mode, urls, n, chunk_size, repeat, exclude_private_suffix)
+            ops = measured["ops_per_sec"]["mean"]
+            if baseline is None:
+                baseline = ops / workers[0]
+            efficiency = ops / (n * baseline)
+            if mode == "threads":
+                label, rss = "process rss", measured["process_rss_bytes"]
+            else:
+                label, rss = "rss/worker", measured["worker_max_rss_bytes"]
+            print("%-22s %2d workers %s  efficiency %5.1f%%  startup %6.3f s  %s %s" % (
+                mode, n, format_ops(measured["ops_per_sec"]), efficiency * 100,
+                measured["startup_seconds"], label,
+                "%.1f MiB" % (rss / 2.0 ** 20) if rss else "n/a"))
+            results.append(dict(name="%s/%d" % (mode, n), mode=mode, workers=n, urls=num_urls,
+                                chunk_size=chunk_size, efficiency=efficiency, **measured))
+    return results
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cold start cost of fasttld, each run in a fresh interpreter:
+import time, public suffix list parse time, trie build time and time to first extraction,
+with and without lazy=True.
+
+@author: Wu Tingfeng
+@file: startup.py
+
+Copyright (c) 2022 Wu Tingfeng
+"""
+import json
+import os
+import subprocess
+import sys
+
+from tests.benchmarks.common import summarize
+
+STARTUP_CODE = """
+import json, sys, time
+t0 = time.perf_counter()
+import fasttld
+t1 = time.perf_counter()
+# fasttld.FastTLDExtract is the class, re-exported over the module of the same name
+module = sys.modules["fasttld.FastTLDExtract"]
+parse = []
+parse_func = module.getPublicSuffixRules
+
+
+def timed_parse(*args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return parse_func(*args, **kwargs)
+    finally:
+        parse.append(time.perf_counter() - start)
+
+
+module.getPublicSuffixRules = timed_parse
+t2 = time.perf_counter()
+t = fasttld.FastTLDExtract(exclude_private_suffix=%s, lazy=%s)
+t3 = time.perf_counter()
+t.extract("https://user@www.example.co.uk:8080/path?query=42")
+t4 = time.perf_counter()
+json.dump({
+    "import_seconds": t1 - t0,
+    "parse_seconds": sum(parse),
+    "build_seconds": t3 - t2 - sum(parse),
+    "first_extract_seconds": t4 - t3,
+    "total_seconds": t4 - t0,
+}, sys.stdout)
+"""
+
+PHASES = ("import_seconds", "parse_seconds", "build_seconds", "first_extract_seconds",
+          "total_seconds")
+
+
+def measure(exclude_private_suffix, lazy=False):
+    env = dict(os.environ, FASTTLD_NO_AUTO_UPDATE="1")
+    out = subprocess.run([sys.executable, "-c",
+                          STARTUP_CODE % (exclude_private_suffix, lazy)],
+                         env=env, check=True, stdout=subprocess.PIPE).stdout
+    return json.loads(out)
+
+
+def run(repeat=10, warmup=1):
+    results = []
+    for lazy in (False, True):
+        for exclude_private_suffix in (True, False):
+            for _ in range(warmup):
+                measure(exclude_private_suffix, lazy)
+            runs = [measure(exclude_private_suffix, lazy) for _ in range(repeat)]
+            name = "startup/exclude_private_suffix=%s" % exclude_private_suffix
+            if lazy:
+                name += "/lazy"
+            result = {"name": name, "runs": repeat}
+            print(name)
+            for phase in PHASES:
+                summary = summarize([r[phase] for r in runs])
+                low, high = summary["ci95"]
+                print("    %-24s %9.2f ms  (95%% CI %.2f - %.2f)" % (
+                    phase, summary["mean"] * 1e3, low * 1e3, high * 1e3))
+                result[phase] = summary["mean"]
+                result[phase.replace("_seconds", "")] = summary
+            results.append(result)
+    return results
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Reproducible synthetic URL corpora derived from the Public Suffix List.
+
+>>> gen = CorpusGenerator(seed=42)
+>>> gen.generate(100000)  # Zipf-distributed traffic over every rule type
+>>> gen.by_rule_type(1000)  # {rule_type: urls} with 1000 URLs per rule type
+
+@author: Wu Tingfeng
+@file: synthetic.py
+
+Copyright (c) 2022 Wu Tingfeng
+"""
+import bisect
+import itertools
+import random
+
+from fasttld.psl import getPublicSuffixRules
+
+RULE_TYPES = ("plain", "multi_label", "wildcard", "exception", "private", "idn")
+
+DEFAULT_RULE_MIX = {
+    "plain": 50,
+    "multi_label": 20,
+    "wildcard": 3,
+    "exception": 1,
+    "private": 16,
+    "idn": 10,
+}
+
+# Probability of 0, 1, 2, ... subdomain labels in front of the registered domain
+DEFAULT_DEPTH_WEIGHTS = (40, 35, 15, 6, 3, 1)
+
+SCHEMES = ("https://", "http://", "ftp://", "//")
+LABEL_CHARS = "abcdefghijklmnopqrstuvwxyz0123456789"
+IDN_LABEL_CHARS = "食狮中国公司网络例子香港新加坡测试"
+SUBDOMAIN_LABELS = ("www", "mail", "api", "cdn", "m", "static", "img", "blog", "shop", "dev")
+
+
+def classify_rule(rule, private):
+    """Rule type of a Public Suffix List rule, one of RULE_TYPES."""
+    if rule.startswith("*."):
+        return "wildcard"
+    if rule.startswith("!"):
+        return "exception"
+    if not rule.isascii() or "xn--" in rule:
+        return "idn"
+    if private:
+        return "private"
+    if "." in rule:
+        return "multi_label"
+    return "plain"
+
+
+def load_rules(file_path=""):
+    """
+    Public Suffix List rules grouped by rule type, in file order.
+    :return: dict of rule type to list of rules
+    """
+    rules = dict((rule_type, []) for rule_type in RULE_TYPES)
+    for rule, private in getPublicSuffixRules(file_path):
+        rules[classify_rule(rule, private)].append(rule)
+    return rules
+
+
+class CorpusGenerator(object):
+    def __init__(self, seed=0, file_path="", pool_size=10000, zipf_s=1.1, rule_mix=None,
+                 depth_weights=DEFAULT_DEPTH_WEIGHTS, scheme_ratio=0.5, userinfo_ratio=0.02,
+                 port_ratio=0.05, path_ratio=0.3, ip_ratio=0.05, ipv6_share=0.3):
+        """
+        :param seed: Seed of the random number generator. Equal parameters give equal corpora.
+        :param file_path: Public suffix list file. Defaults to the bundled list.
+        :param pool_size: Number of distinct registered domains that generate() draws from.
+        :param zipf_s: Exponent of the Zipf popularity of the registered domains.
+        :param rule_mix: dict of rule type to relative weight, see DEFAULT_RULE_MIX.
+        :param depth_weights: Relative weights of 0, 1, 2, ... subdomain labels.
+        :param scheme_ratio: Fraction of URLs with a scheme.
+        :param userinfo_ratio: Fraction of URLs with userinfo.
+        :param port_ratio: Fraction of URLs with a port.
+        :param path_ratio: Fraction of URLs with a path, query or fragment.
+        :param ip_ratio: Fraction of URLs whose host is an IP address.
+        :param ipv6_share: Fraction of IP addresses that are IPv6.
+        """
+        self.seed = seed
+        self.rules = load_rules(file_path)
+        self.pool_size = pool_size
+        self.zipf_s = zipf_s
+        self.rule_mix = dict(rule_mix or DEFAULT_RULE_MIX)
+        self.depth_weights = depth_weights
+        self.scheme_ratio = scheme_ratio
+        self.userinfo_ratio = userinfo_ratio
+        self.port_ratio = port_ratio
+        self.path_ratio = path_ratio
+        self.ip_ratio = ip_ratio
+        self.ipv6_share = ipv6_share
+
+    def _label(self, rng, idn=False):
+        chars = IDN_LABEL_CHARS if idn else LABEL_CHARS
+        return "".join(rng.choice(chars) for _ in range(rng.randint(2, 6 if idn else 12)))
+
+    def _registered_domain(self, rng, rule_type):
+        """A registered domain (without subdomains) under a random rule of rule_type."""
+        rule = rng.choice(self.rules[rule_type])
+        if rule_type == "exception":
+            # !www.ck => www.ck is itself a registered domain
+            return rule[1:]
+        if rule_type == "wildcard":
+            rule = self._label(rng) + rule[1:]
+        return self._label(rng, idn=rule_type == "idn" and rng.random() < 0.5) + "." + rule
+
+    def _ip(self, rng):
+        if rng.random() < self.ipv6_share:
+            return "[%s]" % ":".join("%x" % rng.randint(0, 0xffff) for _ in range(8))
+        return ".".join(str(rng.randint(0, 255)) for _ in range(4))
+
+    def _url(self, rng, host, ip=False):
+        depth = 0 if ip else rng.choices(range(len(self.depth_weights)),
+                                         weights=self.depth_weights)[0]
+        if depth:
+            host = ".".join(rng.choice(SUBDOMAIN_LABELS) if i == 0 else self._label(rng)
+                            for i in range(depth)) + "." + host
+        url = host
+        if rng.random() < self.userinfo_ratio:
+            url = "user:pass@" + url
+        if rng.random() < self.port_ratio:
+            url += ":%d" % rng.randint(1, 65535)
+        if rng.random() < self.path_ratio:
+            url += "/" + "/".join(self._label(rng) for _ in range(rng.randint(1, 4)))
+            if rng.random() < 0.5:
+                url += "?q=%d" % rng.randint(0, 1000)
+        if rng.random() < self.scheme_ratio:
+            url = rng.choice(SCHEMES) + url
+        return url
+
+    def rule_types(self):
+        """Rule types with a positive weight in rule_mix and at least one rule."""
+        return [rule_type for rule_type in RULE_TYPES
+                if self.rule_mix.get(rule_type, 0) > 0 and self.rules[rule_type]]
+
+    def generate(self, n):
+        """
+        n URLs drawn with Zipf popularity from a pool of pool_size registered domains,
+        each under a rule type drawn from rule_mix. A fraction ip_ratio are IP addresses.
+        :return: list of URLs
+        """
+        rng = random.Random(self.seed)
+        rule_types = self.rule_types()
+        weights = [self.rule_mix[rule_type] for rule_type in rule_types]
+        pool = [self._registered_domain(rng, rule_type)
+                for rule_type in rng.choices(rule_types, weights=weights, k=self.pool_size)]
+        cum_weights = list(itertools.accumulate(
+            1.0 / (rank ** self.zipf_s) for rank in range(1, len(pool) + 1)))
+        total = cum_weights[-1]
+        urls = []
+        for _ in range(n):
+            if rng.random() < self.ip_ratio:
+                urls.append(self._url(rng, self._ip(rng), ip=True))
+            else:
+                urls.append(self._url(rng, pool[bisect.bisect_left(cum_weights,
+                                                                   rng.random() * total)]))
+        return urls
+
+    def by_rule_type(self, n):
+        """
+        n URLs for every rule type, plus n IP addresses, each registered domain drawn uniformly.
+        :return: dict of rule type (or "ip") to list of URLs
+        """
+        rng = random.Random(self.seed)
+        corpora = dict((rule_type, [self._url(rng, self._registered_domain(rng, rule_type))
+                                    for _ in range(n)])
+                       for rule_type in RULE_TYPES if self.rules[rule_type])
+        corpora["ip"] = [self._url(rng, self._ip(rng), ip=True) for _ in range(n)]
+        return corpora
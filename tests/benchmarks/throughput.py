@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Throughput of FastTLDExtract.extract on each corpus, optionally
+compared with tldextract and tld when they are installed.
+
+@author: Wu Tingfeng
+@file: throughput.py
+
+Copyright (c) 2022 Wu Tingfeng
+"""
+from fasttld import FastTLDExtract
+from tests.benchmarks.common import format_ops, measure_ops
+
+
+def competitors():
+    """(name, callable, kwargs) of every installed competitor module."""
+    found = []
+    try:
+        import tldextract
+        found.append(("tldextract", tldextract.extract, {}))
+    except ImportError:
+        pass
+    try:
+        from tld import get_tld
+        found.append(("tld", get_tld, {"fix_protocol": True, "fail_silently": True}))
+    except ImportError:
+        pass
+    return found
+
+
+def run(corpora, number=1000, repeat=10, warmup=1, compare=False, exclude_private_suffix=True):
+    t = FastTLDExtract(exclude_private_suffix=exclude_private_suffix)
+    cases = [
+        ("fasttld_with_subdomains", t.extract, {"subdomain": True}),
+        ("fasttld_without_subdomains", t.extract, {"subdomain": False}),
+    ]
+    if compare:
+        cases += competitors()
+
+    results = []
+    for module, func, kwargs in cases:
+        for corpus_name, urls in corpora.items():
+            summary = measure_ops(func, urls, kwargs, number=number, repeat=repeat, warmup=warmup)
+            print("%-28s %-20s %s" % (module, corpus_name, format_ops(summary)))
+            results.append({
+                "name": "%s/%s" % (module, corpus_name),
+                "module": module,
+                "corpus": corpus_name,
+                "inputs": len(urls),
+                "ops_per_sec": summary,
+            })
+    return results
@@ -1,7 +1,37 @@
 # -*- coding: utf-8 -*-
+import datetime
+import os
+import sys
+import tempfile
+import threading
+import time
 import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
 
+import fasttld.psl
 from fasttld import FastTLDExtract
+from fasttld.FastTLDExtract import (PRIVATE_KEY, TLDResult, _extract_bytes_profiled,
+                                    whitespace)
+from fasttld.impact import HostIndex, changed_hosts, changed_prefixes
+from fasttld.instrument import run_profiled
+from fasttld.psl import getPublicSuffixList, getPublicSuffixRules, punycode
+from fasttld.snapshots import SnapshotStore
+from fasttld.watch import FileWatcher
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    from fasttld.parquet import transform_parquet
+except ImportError:
+    pa = None
+
+try:
+    import pandas as pd
+
+    import fasttld.pandas_accessor  # noqa: F401
+except ImportError:
+    pd = None
 
 all_suffix = FastTLDExtract(exclude_private_suffix=False)
 no_private_suffix = FastTLDExtract(exclude_private_suffix=True)
@@ -10,7 +40,8 @@ no_private_suffix = FastTLDExtract(exclude_private_suffix=True)
 class FastTLDTrieCase(unittest.TestCase):
     def test_all_suffix_trie(self):
         trie = all_suffix.trie
-        self.assertEqual(trie["cn"]["com"], True)
+        self.assertEqual(trie["cn"]["com"]["_END"], True)
+        self.assertEqual(trie["cn"]["com"][PRIVATE_KEY], {"amazonaws"})
         self.assertEqual("blogspot" in trie["uk"]["co"], True)
         self.assertEqual("*" in trie["uk"], False)
         self.assertEqual("_END" in trie["cn"], True)
@@ -18,7 +49,8 @@ class FastTLDTrieCase(unittest.TestCase):
         self.assertEqual(trie["ck"]["!www"], True)
         self.assertEqual(trie["ir"]["xn--mgba3a4f16a"], True)
         # private domain test
-        self.assertEqual(trie["com"]["appspot"], True)
+        self.assertEqual(trie["com"]["appspot"]["_END"], True)
+        self.assertEqual(trie["com"]["appspot"]["r"]["*"], True)
         self.assertEqual(trie["ee"]["com"]["blogspot"], True)
         self.assertEqual(trie["com"]["0emm"]["*"], True)
 
@@ -2549,6 +2581,49 @@ def testHandler(extractor, test):
     )
 
 
+class PublicSuffixRulesCase(unittest.TestCase):
+    data = (
+        "// ===BEGIN ICANN DOMAINS===\n"
+        "com\n"
+        "\n"
+        "// a comment\n"
+        "  *.ck\r\n"
+        "!www.ck\n"
+        "食狮.com.cn\n"
+        "// ===BEGIN PRIVATE DOMAINS===\n"
+        "blogspot.com\n"
+        "個人.香港\n"
+    )
+
+    def test_rules(self):
+        expected = [("com", False), ("*.ck", False), ("!www.ck", False), ("食狮.com.cn", False),
+                    ("xn--85x722f.com.cn", False), ("blogspot.com", True), ("個人.香港", True),
+                    ("xn--gmqw5a.xn--j6w193g", True)]
+        self.assertEqual(getPublicSuffixRules(data=self.data), expected)
+        self.assertEqual(getPublicSuffixRules(data=self.data.encode("utf-8")), expected)
+
+    def test_file(self):
+        with tempfile.NamedTemporaryFile("wb", suffix=".dat", delete=False) as f:
+            f.write(self.data.encode("utf-8"))
+        try:
+            rules = getPublicSuffixRules(f.name)
+            self.assertEqual(len(rules), 8)
+            self.assertEqual(getPublicSuffixList(f.name), (
+                ["com", "*.ck", "!www.ck", "食狮.com.cn", "xn--85x722f.com.cn"],
+                ["blogspot.com", "個人.香港", "xn--gmqw5a.xn--j6w193g"],
+                [rule for rule, _ in rules],
+            ))
+        finally:
+            os.remove(f.name)
+        with self.assertRaises(Exception):
+            getPublicSuffixRules(f.name)
+
+    def test_punycode(self):
+        for rule in ["食狮.com.cn", "Straße.de", "ＡＢＣ.com", "ab\u00adc.com", "食狮\u3002中国",
+                     "MÜNCHEN.de", "اتصالات.مصر"]:
+            self.assertEqual(punycode(rule), rule.encode("idna").decode("utf-8"))
+
+
 class FastTLDExtractCase(unittest.TestCase):
     # schemeTests
     def testScheme(self):
@@ -2909,5 +2984,1142 @@ class FastTLDExtractCase(unittest.TestCase):
         # )
 
 
+class IncludePrivateCase(unittest.TestCase):
+    urls = ["news.blogspot.co.uk", "https://a.b.appspot.com/x", "a.x.r.appspot.com", "www.ck",
+            "a.b.ck", "google.com", "1.1.1.1", "example.zzz", "a.x.dev.adobeaemcloud.com",
+            "s3.cn-north-1.amazonaws.com.cn", "食狮.com.cn"]
+
+    def test_icann_view(self):
+        for url in self.urls:
+            self.assertEqual(all_suffix.extract(url, include_private=False),
+                             no_private_suffix.extract(url))
+            self.assertEqual(all_suffix.extract(url, include_private=True), all_suffix.extract(url))
+            self.assertEqual(no_private_suffix.extract(url, include_private=False),
+                             no_private_suffix.extract(url))
+        self.assertEqual(all_suffix.extract_batch(self.urls, include_private=False),
+                         no_private_suffix.extract_batch(self.urls))
+        self.assertEqual(all_suffix.extract_batch(self.urls, dedupe=True, include_private=False),
+                         no_private_suffix.extract_batch(self.urls))
+
+    def test_nested_private_rules(self):
+        self.assertEqual(
+            all_suffix.extract("a.x.dev.adobeaemcloud.com"),
+            TLDResult("", "", "", "a", "x.dev.adobeaemcloud.com", "", "",
+                      "a.x.dev.adobeaemcloud.com"),
+        )
+        self.assertEqual(
+            all_suffix.extract("s3.cn-north-1.amazonaws.com.cn"),
+            TLDResult("", "", "", "", "s3.cn-north-1.amazonaws.com.cn", "", "", ""),
+        )
+
+    def test_is_private_suffix(self):
+        self.assertEqual(all_suffix.is_private_suffix("blogspot.co.uk"), True)
+        self.assertEqual(all_suffix.is_private_suffix("x.r.appspot.com"), True)
+        self.assertEqual(all_suffix.is_private_suffix("co.uk"), False)
+        self.assertEqual(all_suffix.is_private_suffix("com"), False)
+        self.assertEqual(all_suffix.is_private_suffix("ck"), False)
+        self.assertEqual(all_suffix.is_private_suffix("b.ck"), False)
+        self.assertEqual(all_suffix.is_private_suffix(""), False)
+        self.assertEqual(no_private_suffix.is_private_suffix("blogspot.co.uk"), False)
+        for url in self.urls:
+            res = all_suffix.extract(url)
+            self.assertEqual(all_suffix.is_private_suffix(res.suffix),
+                             res != no_private_suffix.extract(url))
+
+    def test_excluded_private_suffix(self):
+        with self.assertRaises(Exception):
+            no_private_suffix.extract("news.blogspot.co.uk", include_private=True)
+        with self.assertRaises(Exception):
+            no_private_suffix.extract_batch(["news.blogspot.co.uk"], include_private=True)
+
+    def test_rule_hits(self):
+        extractor = FastTLDExtract()
+        extractor.enable_rule_hits()
+        extractor.extract("news.blogspot.co.uk")
+        extractor.extract("news.blogspot.co.uk", include_private=False)
+        self.assertEqual(extractor.rule_hits()["rules"], {"blogspot.co.uk": 1, "co.uk": 1})
+
+    def test_nested_dict_longer_rules(self):
+        d = {}
+        all_suffix.nested_dict(d, keys=["uk", "co"])
+        all_suffix.nested_dict(d, keys=["uk", "co", "bytemark", "dh"])
+        all_suffix.nested_dict(d, keys=["jp", "kawasaki", "*"])
+        all_suffix.nested_dict(d, keys=["jp", "kawasaki"])
+        self.assertDictEqual(d, {
+            "uk": {"co": {"_END": True, "bytemark": {"dh": True}}},
+            "jp": {"kawasaki": {"_END": True, "*": True}},
+        })
+
+        d = {}
+        all_suffix.nested_dict(d, keys=["uk", "co"])
+        all_suffix.nested_dict_private(d, keys=["uk", "co", "blogspot"])
+        all_suffix.nested_dict_private(d, keys=["uk", "co"])
+        all_suffix.nested_dict(d, keys=["jp", "kawasaki", "*"])
+        all_suffix.nested_dict_private(d, keys=["jp", "kawasaki"])
+        self.assertDictEqual(d, {
+            "uk": {"co": {"_END": True, "blogspot": True, PRIVATE_KEY: {"blogspot"}}},
+            "jp": {"kawasaki": {"_END": True, "*": True, PRIVATE_KEY: {"_END"}}},
+        })
+
+
+class SubsetTrieCase(unittest.TestCase):
+    def test_tlds(self):
+        extractor = FastTLDExtract(tlds=[".UK", "xn--j6w193g"])
+        self.assertEqual(set(extractor.trie) - {PRIVATE_KEY}, {"uk", "香港", "xn--j6w193g"})
+        self.assertEqual(extractor.trie["uk"], all_suffix.trie["uk"])
+        self.assertEqual(extractor.extract("a.b.co.uk").suffix, "co.uk")
+        self.assertEqual(extractor.extract("a.b.blogspot.co.uk").suffix, "blogspot.co.uk")
+        self.assertEqual(extractor.extract("a.公司.香港").suffix, "公司.香港")
+        # Other TLDs are unlisted
+        self.assertEqual(extractor.extract("www.google.com"),
+                         no_private_suffix.extract("www.example.zzz")._replace(
+                             subdomain="www.google", domain="com"))
+        self.assertEqual(extractor.reload(), {"added": [], "removed": [], "tlds": []})
+
+    def test_sections(self):
+        extractor = FastTLDExtract(exclude_private_suffix=True, tlds=["uk"])
+        self.assertEqual(extractor.trie, {"uk": no_private_suffix.trie["uk"]})
+
+        extractor = FastTLDExtract(rule_filter=lambda rule, private: private)
+        self.assertEqual(extractor.extract("a.b.ck").suffix, "")
+        self.assertEqual(extractor.extract("a.b.blogspot.co.uk").suffix, "blogspot.co.uk")
+
+    def test_rule_filter(self):
+        extractor = FastTLDExtract(rule_filter=lambda rule, private: rule != "blogspot.co.uk")
+        self.assertEqual(extractor.extract("a.b.blogspot.co.uk").suffix, "co.uk")
+        extractor.add_rules(["blogspot.co.uk"], private=True)
+        self.assertEqual(extractor.trie, all_suffix.trie)
+
+
+class LazyTrieCase(unittest.TestCase):
+    urls = ["www.example.co.uk", "a.b.blogspot.co.uk", "a.b.ck", "www.ck", "example.zzz",
+            "a.公司.香港", "a.b.kawasaki.jp", "city.kawasaki.jp", "1.1.1.1", "[::1]", ""]
+
+    def test_extract(self):
+        for exclude_private_suffix, reference in ((False, all_suffix), (True, no_private_suffix)):
+            extractor = FastTLDExtract(exclude_private_suffix=exclude_private_suffix, lazy=True)
+            self.assertEqual(dict(extractor.trie), {})
+            for url in self.urls:
+                self.assertEqual(extractor.extract(url), reference.extract(url))
+            self.assertEqual(set(extractor.trie), {"uk", "ck", "香港", "jp"})
+            for tld in list(extractor.trie.pending):
+                extractor.trie.materialise(tld)
+            self.assertEqual(extractor.trie, reference.trie)
+
+    def test_include_private(self):
+        extractor = FastTLDExtract(lazy=True)
+        for url in self.urls:
+            self.assertEqual(extractor.extract(url, include_private=False),
+                             no_private_suffix.extract(url))
+        self.assertEqual(extractor.is_private_suffix("blogspot.com"), True)
+
+    def test_memory_report(self):
+        extractor = FastTLDExtract(lazy=True)
+        report = extractor.memory_report()
+        self.assertEqual(report["nodes"], 1)
+        self.assertEqual(report["pending_tlds"], len(extractor.trie.pending))
+        self.assertEqual(report["total_bytes"], report["node_bytes"] + report["index_bytes"])
+        self.assertLess(report["total_bytes"], all_suffix.memory_report()["total_bytes"])
+
+    def test_rules(self):
+        extractor = FastTLDExtract(lazy=True)
+        extractor.add_rules(["corp.example", "corp.com"])
+        # Pending TLDs are updated without building them
+        self.assertEqual(dict(extractor.trie), {})
+        self.assertEqual(extractor.extract("a.b.corp.example").suffix, "corp.example")
+        self.assertEqual(extractor.extract("a.b.corp.com").suffix, "corp.com")
+        extractor.remove_rules(["corp.example", "corp.com", "ac.uk"])
+        self.assertEqual(extractor.extract("a.b.ac.uk").suffix, "uk")
+        self.assertEqual(extractor.reload(), {"added": [], "removed": [], "tlds": []})
+        extractor.add_rules(["ac.uk"])
+        for tld in list(extractor.trie.pending):
+            extractor.trie.materialise(tld)
+        self.assertEqual(extractor.trie, all_suffix.trie)
+
+    def test_concurrent_lookups(self):
+        tlds = [tld for tld in all_suffix.trie if tld != PRIVATE_KEY]
+        urls = ["www.example." + tld for tld in tlds]
+        expected = [all_suffix.extract(url) for url in urls]
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for _ in range(5):
+                extractor = FastTLDExtract(lazy=True)
+                errors = []
+
+                def lookups(offset):
+                    try:
+                        order = list(range(offset, len(urls))) + list(range(offset))
+                        for i in order:
+                            self.assertEqual(extractor.extract(urls[i]), expected[i])
+                    except Exception as e:
+                        errors.append(e)
+
+                def readers():
+                    try:
+                        for _ in range(3):
+                            self.assertEqual(extractor.reload(),
+                                             {"added": [], "removed": [], "tlds": []})
+                            extractor.trie.copy()
+                            extractor.memory_report()
+                    except Exception as e:
+                        errors.append(e)
+
+                threads = [threading.Thread(target=lookups, args=(i * len(urls) // 8,))
+                           for i in range(8)]
+                threads.append(threading.Thread(target=readers))
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                self.assertEqual(errors, [])
+                self.assertEqual(extractor.trie, all_suffix.trie)
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+
+class CustomRulesCase(unittest.TestCase):
+    def test_add_remove_rules(self):
+        extractor = FastTLDExtract()
+        before = extractor.trie
+        extractor.add_rules(["corp.example", "*.svc.cluster.local", "!www.svc.cluster.local",
+                             "corp.com"])
+        # The previous trie is left untouched and unchanged TLDs are shared
+        self.assertEqual(before, all_suffix.trie)
+        self.assertIsNot(extractor.trie, before)
+        self.assertIs(extractor.trie["uk"], before["uk"])
+
+        self.assertEqual(extractor.extract("a.b.corp.example"),
+                         TLDResult("", "", "a", "b", "corp.example", "", "", "b.corp.example"))
+        self.assertEqual(
+            extractor.extract("a.b.svc.cluster.local"),
+            TLDResult("", "", "", "a", "b.svc.cluster.local", "", "", "a.b.svc.cluster.local"),
+        )
+        self.assertEqual(
+            extractor.extract("www.svc.cluster.local"),
+            TLDResult("", "", "", "www", "svc.cluster.local", "", "", "www.svc.cluster.local"),
+        )
+        self.assertEqual(extractor.extract("a.b.corp.com").suffix, "corp.com")
+        self.assertEqual(extractor.extract("a.b.blogspot.com").suffix, "blogspot.com")
+        self.assertEqual(extractor.is_private_suffix("corp.com"), False)
+
+        extractor.remove_rules(["corp.example", "*.svc.cluster.local", "!www.svc.cluster.local",
+                                "corp.com", "not.a.rule"])
+        self.assertEqual(extractor.trie, all_suffix.trie)
+
+    def test_remove_psl_rules(self):
+        extractor = FastTLDExtract()
+        extractor.remove_rules(["ac.uk", "blogspot.co.uk"])
+        self.assertEqual(extractor.extract("a.b.ac.uk").suffix, "uk")
+        self.assertEqual(extractor.extract("a.blogspot.co.uk").suffix, "co.uk")
+        self.assertEqual(extractor.extract("a.b.co.uk").suffix, "co.uk")
+        extractor.add_rules(["ac.uk"])
+        extractor.add_rules(["blogspot.co.uk"], private=True)
+        self.assertEqual(extractor.trie, all_suffix.trie)
+
+    def test_remove_rule_with_longer_rules(self):
+        extractor = FastTLDExtract()
+        extractor.remove_rules(["co.uk"])
+        self.assertNotIn("_END", extractor.trie["uk"]["co"])
+        # The node is kept for blogspot.co.uk and the others, so the walk still matches it
+        self.assertEqual(extractor.extract("a.b.co.uk").suffix, "co.uk")
+        extractor.remove_rules([rule for rule, _ in getPublicSuffixRules()
+                                if rule.endswith(".co.uk")])
+        self.assertNotIn("co", extractor.trie["uk"])
+        self.assertEqual(extractor.extract("a.b.co.uk").suffix, "uk")
+
+    def test_private_rules(self):
+        extractor = FastTLDExtract()
+        extractor.add_rules(["tenant.example.com"], private=True)
+        self.assertEqual(extractor.extract("a.tenant.example.com").suffix, "tenant.example.com")
+        self.assertEqual(extractor.is_private_suffix("tenant.example.com"), True)
+        self.assertEqual(extractor.extract("a.tenant.example.com", include_private=False).suffix,
+                         "com")
+
+        extractor = FastTLDExtract(exclude_private_suffix=True)
+        extractor.add_rules(["tenant.example.com"], private=True)
+        self.assertEqual(extractor.trie, no_private_suffix.trie)
+
+    def test_idn_rules(self):
+        extractor = FastTLDExtract()
+        extractor.add_rules(["例子.测试"])
+        self.assertEqual(extractor.extract("a.例子.测试").suffix, "例子.测试")
+        self.assertEqual(extractor.extract("a.xn--fsqu00a.xn--0zwm56d").suffix,
+                         "xn--fsqu00a.xn--0zwm56d")
+        extractor.remove_rules(["例子.测试"])
+        self.assertEqual(extractor.trie, all_suffix.trie)
+
+    def test_invalid_rules(self):
+        extractor = FastTLDExtract()
+        for rule in ["", "a..b", ".com", "*", "!com", "foo.*.example", "a.!b.c", "!*.ck", "a*.ck",
+                     "*.!b.ck", "!", "*.*.ck"]:
+            with self.assertRaises(Exception):
+                extractor.add_rules([rule])
+
+
+class ReloadCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        path = os.path.join(os.path.dirname(os.path.realpath(fasttld.psl.__file__)),
+                            "public_suffix_list.dat")
+        with open(path, encoding="utf-8") as f:
+            cls.data = f.read()
+
+    def test_unchanged(self):
+        extractor = FastTLDExtract()
+        trie = extractor.trie
+        self.assertEqual(extractor.reload(), {"added": [], "removed": [], "tlds": []})
+        self.assertIs(extractor.trie, trie)
+
+    def test_diff(self):
+        extractor = FastTLDExtract()
+        before = extractor.trie
+        data = self.data.replace("\nac.uk\n", "\n").replace(
+            "\nblogspot.com\n", "\nblogspot.com\ntenant.blogspot.com\n") + "\ncorp.example\n"
+        self.assertEqual(extractor.reload(data), {
+            "added": [("corp.example", True), ("tenant.blogspot.com", True)],
+            "removed": ["ac.uk"],
+            "tlds": ["com", "example", "uk"],
+        })
+        self.assertIs(extractor.trie["cn"], before["cn"])
+        self.assertEqual(extractor.extract("a.b.ac.uk").suffix, "uk")
+        self.assertEqual(extractor.extract("a.tenant.blogspot.com").suffix, "tenant.blogspot.com")
+        self.assertEqual(extractor.extract("a.corp.example").suffix, "corp.example")
+
+        extractor.reload(self.data)
+        self.assertEqual(extractor.trie, all_suffix.trie)
+
+    def test_custom_rules_kept(self):
+        extractor = FastTLDExtract(exclude_private_suffix=True)
+        extractor.add_rules(["corp.example"])
+        extractor.remove_rules(["ac.uk"])
+        self.assertEqual(extractor.reload("new.example\n" + self.data), {
+            "added": [("new.example", False)], "removed": [], "tlds": ["example"]})
+        self.assertEqual(extractor.extract("a.b.corp.example").suffix, "corp.example")
+        self.assertEqual(extractor.extract("a.b.ac.uk").suffix, "uk")
+
+    def test_concurrent_custom_rules(self):
+        extractor = FastTLDExtract()
+
+        class RemovedRules(set):
+            changed = False
+
+            def __iter__(self):
+                rules = list(set.__iter__(self))
+                if not self.changed:
+                    # As if another thread added a rule just after reload() read the custom rules
+                    self.changed = True
+                    extractor.add_rules(["corp.example"])
+                return iter(rules)
+
+        extractor._removed_rules = RemovedRules()
+        self.assertEqual(extractor.reload(self.data), {"added": [], "removed": [], "tlds": []})
+        self.assertEqual(extractor.extract("a.b.corp.example").suffix, "corp.example")
+
+
+class SnapshotStoreCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        path = os.path.join(os.path.dirname(os.path.realpath(fasttld.psl.__file__)),
+                            "public_suffix_list.dat")
+        with open(path, encoding="utf-8") as f:
+            cls.data = f.read()
+
+    def test_as_of(self):
+        store = SnapshotStore()
+        self.assertIsNone(store.add(datetime.date(2023, 1, 1), data=self.data))
+        self.assertEqual(store.add(datetime.date(2024, 1, 1),
+                                   data=self.data.replace("\nac.uk\n", "\n")),
+                         {"added": [], "removed": ["ac.uk"], "tlds": ["uk"]})
+        # Added out of order, derived from the 2023 snapshot
+        self.assertEqual(store.add(datetime.date(2023, 7, 1), data="corp.example\n" + self.data),
+                         {"added": [("corp.example", False)], "removed": [], "tlds": ["example"]})
+        self.assertEqual(store.dates(), [datetime.date(2023, 1, 1), datetime.date(2023, 7, 1),
+                                         datetime.date(2024, 1, 1)])
+
+        self.assertEqual(store.extract("a.b.ac.uk", as_of=datetime.date(2023, 12, 31)).suffix,
+                         "ac.uk")
+        self.assertEqual(store.extract("a.b.ac.uk", as_of=datetime.date(2024, 1, 1)).suffix, "uk")
+        self.assertEqual(store.extract("a.b.ac.uk").suffix, "uk")
+        self.assertEqual(store.extract("a.corp.example", as_of=datetime.date(2023, 8, 1)).suffix,
+                         "corp.example")
+        self.assertEqual(store.extract("a.corp.example", as_of=datetime.date(2023, 1, 1)).suffix,
+                         "")
+        self.assertEqual(store.extract_batch(["a.b.ac.uk"], as_of=datetime.date(2023, 1, 1)),
+                         all_suffix.extract_batch(["a.b.ac.uk"]))
+        with self.assertRaises(Exception):
+            store.extract("a.b.ac.uk", as_of=datetime.date(2022, 12, 31))
+
+    def test_shared_nodes(self):
+        store = SnapshotStore()
+        store.add(datetime.date(2023, 1, 1))
+        store.add(datetime.date(2024, 1, 1), data=self.data.replace("\nac.uk\n", "\n"))
+        before = store.snapshot(datetime.date(2023, 1, 1)).trie
+        after = store.snapshot().trie
+        self.assertEqual(before, all_suffix.trie)
+        self.assertIs(after["com"], before["com"])
+        self.assertIsNot(after["uk"], before["uk"])
+        self.assertIs(after["uk"]["co"], before["uk"]["co"])
+
+    def test_instrumented_snapshot(self):
+        store = SnapshotStore()
+        store.add(datetime.date(2023, 1, 1), data=self.data)
+        before = store.snapshot(datetime.date(2023, 1, 1))
+        before.enable_metrics()
+        before.add_rules(["corp.example"])
+        store.add(datetime.date(2024, 1, 1), data=self.data.replace("\nac.uk\n", "\n"))
+        after = store.snapshot(datetime.date(2024, 1, 1))
+        # Neither instrumentation nor custom rules are carried over
+        self.assertNotIn("extract", after.__dict__)
+        self.assertEqual(after.stats()["calls"], 0)
+        self.assertEqual(store.extract("a.b.ac.uk", as_of=datetime.date(2024, 1, 1)).suffix, "uk")
+        self.assertEqual(store.extract("a.corp.example").suffix, "")
+        self.assertEqual(store.extract("a.b.ac.uk", as_of=datetime.date(2023, 1, 1)).suffix,
+                         "ac.uk")
+        self.assertEqual(before.stats()["calls"], 1)
+        self.assertEqual(after.stats()["calls"], 0)
+
+    def test_first_snapshot_from_data(self):
+        store = SnapshotStore()
+        self.assertIsNone(store.add(datetime.date(2023, 1, 1), data="com\nco.uk\n"))
+        snapshot = store.snapshot()
+        # Compiled from data alone, without building the bundled list first
+        self.assertEqual(snapshot.trie_constructions, 1)
+        self.assertEqual(sorted(snapshot.trie), ["com", "uk"])
+        self.assertEqual(store.extract("a.b.co.uk").suffix, "co.uk")
+
+    def test_empty(self):
+        with self.assertRaises(Exception):
+            SnapshotStore().extract("a.b.ac.uk")
+
+
+class ImpactCase(unittest.TestCase):
+    hosts = ["foo.tenant.blogspot.com", "tenant.blogspot.com", "a.blogspot.com",
+             "tenant.blogspot-x.com", "www.example.ac.uk", "example.ac.uk", "a.b.co.uk",
+             "a.corp.example", "example.com", "a.b.ck"]
+
+    def test_changed_prefixes(self):
+        after = FastTLDExtract()
+        after.add_rules(["tenant.blogspot.com"], private=True)
+        after.remove_rules(["ac.uk"])
+        after.add_rules(["!x.ck"])
+        # blogspot.com was a leaf, so every host under it may change
+        self.assertEqual(changed_prefixes(all_suffix.trie, after.trie),
+                         ["ck.x", "com.blogspot", "uk.ac"])
+        self.assertEqual(changed_prefixes(all_suffix.trie, all_suffix.trie), [])
+
+    def test_host_index(self):
+        index = HostIndex(self.hosts + ["a.blogspot.com"])
+        self.assertEqual(len(index), len(self.hosts))
+        self.assertEqual(sorted(index.under("com.blogspot")),
+                         ["a.blogspot.com", "foo.tenant.blogspot.com", "tenant.blogspot.com"])
+        self.assertEqual(index.under("com.blogspot.tenant.foo"), ["foo.tenant.blogspot.com"])
+        self.assertEqual(index.under("org"), [])
+        self.assertEqual(len(index.under("")), len(self.hosts))
+
+    def test_changed_hosts(self):
+        after = FastTLDExtract()
+        after.add_rules(["tenant.blogspot.com", "corp.example"], private=True)
+        after.remove_rules(["ac.uk"])
+        changed = changed_hosts(self.hosts, all_suffix, after)
+        self.assertEqual([host for host, _, _ in changed],
+                         ["tenant.blogspot.com", "foo.tenant.blogspot.com", "a.corp.example",
+                          "example.ac.uk", "www.example.ac.uk"])
+        host, before_result, after_result = changed[1]
+        self.assertEqual(before_result.domain_name, "tenant.blogspot.com")
+        self.assertEqual(after_result.domain_name, "foo.tenant.blogspot.com")
+        # Private section changes only
+        self.assertEqual([host for host, _, _ in changed_hosts(self.hosts, all_suffix, after,
+                                                               include_private=False)],
+                         ["example.ac.uk", "www.example.ac.uk"])
+
+
+class PSLRequestHandler(BaseHTTPRequestHandler):
+    """Serves server.body with an ETag, honouring If-None-Match."""
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == self.server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", self.server.etag)
+        self.send_header("Content-Length", str(len(self.server.body)))
+        self.end_headers()
+        self.wfile.write(self.server.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class UpdateCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        path = os.path.join(os.path.dirname(os.path.realpath(fasttld.psl.__file__)),
+                            "public_suffix_list.dat")
+        with open(path, "rb") as f:
+            cls.data = f.read()
+        cls.server = HTTPServer(("127.0.0.1", 0), PSLRequestHandler)
+        cls.url = "http://127.0.0.1:%d/public_suffix_list.dat" % cls.server.server_port
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.requests = []
+        self.server.etag = '"v1"'
+        self.server.body = self.data
+        self.dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.dir, "public_suffix_list.dat")
+
+    def tearDown(self):
+        for name in os.listdir(self.dir):
+            os.unlink(os.path.join(self.dir, name))
+        os.rmdir(self.dir)
+
+    def test_conditional_update(self):
+        self.assertTrue(fasttld.psl.update(False, url=self.url, file_path=self.file_path))
+        with open(self.file_path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertNotIn("If-None-Match", self.server.requests[0])
+
+        os.utime(self.file_path, (0, 0))
+        self.assertFalse(fasttld.psl.update(False, url=self.url, file_path=self.file_path))
+        self.assertEqual(self.server.requests[1]["If-None-Match"], '"v1"')
+        self.assertGreater(os.path.getmtime(self.file_path), 0)
+
+        self.server.etag = '"v2"'
+        self.server.body = self.data.replace(b"\nac.uk\n", b"\n")
+        self.assertTrue(fasttld.psl.update(False, url=self.url, file_path=self.file_path))
+        with open(self.file_path, "rb") as f:
+            self.assertEqual(f.read(), self.server.body)
+        # Only the list and its validators, no leftover temporary file
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         ["public_suffix_list.dat", "public_suffix_list.dat.validators.json"])
+
+    def test_rejected_list(self):
+        with open(self.file_path, "wb") as f:
+            f.write(self.data)
+        for body in (b"com\nnet\n", b"\xff\xfe"):
+            self.server.body = body
+            with self.assertRaises(Exception):
+                fasttld.psl.update(False, url=self.url, file_path=self.file_path)
+            with open(self.file_path, "rb") as f:
+                self.assertEqual(f.read(), self.data)
+        self.assertEqual(os.listdir(self.dir), ["public_suffix_list.dat"])
+
+    def test_extractor_update(self):
+        with open(self.file_path, "wb") as f:
+            f.write(self.data)
+        extractor = FastTLDExtract(file_path=self.file_path)
+        self.server.body = self.data.replace(b"\nac.uk\n", b"\n")
+        self.assertEqual(extractor.update(False, url=self.url),
+                         {"added": [], "removed": ["ac.uk"], "tlds": ["uk"]})
+        with open(self.file_path, "rb") as f:
+            self.assertEqual(f.read(), self.server.body)
+
+    def test_extractor_update_not_modified(self):
+        self.assertTrue(fasttld.psl.update(False, url=self.url, file_path=self.file_path))
+        extractor = FastTLDExtract(file_path=self.file_path)
+
+        def reload(*args, **kwargs):
+            self.fail("reload() after a 304")
+
+        extractor.reload = reload
+        self.assertEqual(extractor.update(False, url=self.url),
+                         {"added": [], "removed": [], "tlds": []})
+        self.assertEqual(self.server.requests[-1]["If-None-Match"], '"v1"')
+
+    def test_extractor_update_other_file(self):
+        extractor = FastTLDExtract()
+        self.server.body = self.data.replace(b"\nac.uk\n", b"\n")
+        self.assertEqual(extractor.update(False, url=self.url, file_path=self.file_path),
+                         {"added": [], "removed": ["ac.uk"], "tlds": ["uk"]})
+        self.assertEqual(extractor.file_path, "")
+
+
+class WatchCase(unittest.TestCase):
+    def setUp(self):
+        path = os.path.join(os.path.dirname(os.path.realpath(fasttld.psl.__file__)),
+                            "public_suffix_list.dat")
+        with open(path, "rb") as f:
+            self.data = f.read()
+        self.dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.dir, "public_suffix_list.dat")
+        with open(self.file_path, "wb") as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        for name in os.listdir(self.dir):
+            os.unlink(os.path.join(self.dir, name))
+        os.rmdir(self.dir)
+
+    def replace_file(self, data):
+        tmp_path = self.file_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.file_path)
+
+    def test_watch(self):
+        extractor = FastTLDExtract(file_path=self.file_path)
+        diffs = []
+        changed = threading.Event()
+
+        def callback(diff):
+            diffs.append(diff)
+            changed.set()
+
+        watcher = extractor.watch(interval=0.01, callback=callback)
+        # extract() is left alone
+        self.assertNotIn("extract", extractor.__dict__)
+        try:
+            self.replace_file(self.data.replace(b"\nac.uk\n", b"\n"))
+            self.assertTrue(changed.wait(10))
+            self.assertEqual(diffs, [{"added": [], "removed": ["ac.uk"], "tlds": ["uk"]}])
+            self.assertEqual(extractor.extract("a.b.ac.uk").suffix, "uk")
+
+            changed.clear()
+            # Rewritten in place
+            with open(self.file_path, "ab") as f:
+                f.write(b"\ncorp.example\n")
+            self.assertTrue(changed.wait(10))
+            self.assertEqual(extractor.extract("a.b.corp.example").suffix, "corp.example")
+        finally:
+            extractor.unwatch()
+        self.assertFalse(watcher.is_alive())
+
+    def test_reload_error(self):
+        extractor = FastTLDExtract(file_path=self.file_path)
+        watcher = extractor.watch(interval=0.01)
+        try:
+            self.replace_file(b"\xff\xfe")
+            for _ in range(1000):
+                if watcher.error is not None:
+                    break
+                time.sleep(0.01)
+            self.assertIsNotNone(watcher.error)
+            self.assertEqual(extractor.trie, all_suffix.trie)
+            # Retried until the file is fixed
+            self.replace_file(self.data)
+            for _ in range(1000):
+                if watcher.error is None:
+                    break
+                time.sleep(0.01)
+            self.assertIsNone(watcher.error)
+        finally:
+            extractor.unwatch()
+
+    def test_wait_for_stable_file(self):
+        calls = []
+        watcher = FileWatcher(self.file_path, lambda: calls.append(1), interval=3600)
+        try:
+            self.assertFalse(watcher.poll())
+            # Rewritten in place across several polls
+            for chunk in (b"// ===BEGIN ICANN DOMAINS===\n", b"com\n", b"net\n"):
+                with open(self.file_path, "ab") as f:
+                    f.write(chunk)
+                self.assertFalse(watcher.poll())
+            self.assertEqual(calls, [])
+            self.assertTrue(watcher.poll())
+            self.assertEqual(calls, [1])
+            self.assertFalse(watcher.poll())
+        finally:
+            watcher.stop()
+
+    def test_truncated_list(self):
+        extractor = FastTLDExtract(file_path=self.file_path)
+        watcher = extractor.watch(interval=3600)
+        try:
+            self.replace_file(self.data[:len(self.data) // 100])
+            self.assertFalse(watcher.poll())
+            self.assertFalse(watcher.poll())
+            self.assertIsNotNone(watcher.error)
+            self.assertEqual(extractor.trie, all_suffix.trie)
+        finally:
+            extractor.unwatch()
+
+    def test_invalid_interval(self):
+        with self.assertRaises(Exception):
+            FastTLDExtract(file_path=self.file_path).watch(interval=0)
+
+
+class ExtractBatchCase(unittest.TestCase):
+    urls = [
+        "https://www.google.com/a",
+        "https://www.google.com/b",
+        "www.google.com",
+        "https://www.google.com/a",
+        "1.1.1.1",
+        "ftp://1.1.1.1:21",
+        "[::1]",
+        "news.blogspot.co.uk",
+        "https://www.google.com/a",
+    ]
+
+    def test_extract_batch(self):
+        for extractor in (all_suffix, no_private_suffix):
+            for subdomain in (True, False):
+                expected = [extractor.extract(url, subdomain=subdomain) for url in self.urls]
+                for dedupe in (False, True):
+                    self.assertEqual(
+                        extractor.extract_batch(self.urls, subdomain=subdomain, dedupe=dedupe),
+                        expected,
+                    )
+
+    def test_extract_batch_stats(self):
+        stats = {}
+        results = all_suffix.extract_batch(iter(self.urls), dedupe=True, stats=stats)
+        self.assertEqual(
+            stats, {"urls": 9, "parsed_urls": 7, "parsed_hosts": 3, "dedup_ratio": 9 / 7.0}
+        )
+        self.assertIs(results[0], results[3])
+
+        stats = {}
+        all_suffix.extract_batch(self.urls, stats=stats)
+        self.assertEqual(stats,
+                         {"urls": 9, "parsed_urls": 9, "parsed_hosts": 9, "dedup_ratio": 1.0})
+
+        stats = {}
+        self.assertEqual(all_suffix.extract_batch([], dedupe=True, stats=stats), [])
+        self.assertEqual(stats["dedup_ratio"], 1.0)
+
+
+class ProfilingCase(unittest.TestCase):
+    urls = ["https://a.b.google.co.uk/x", "1.1.1.1", "[::1]", "www.ck", "[::1", "食狮.com.cn"]
+
+    def test_profile_report(self):
+        extractor = FastTLDExtract()
+        self.assertEqual(extractor.profile_report(), {"calls": 0, "total_ns": 0, "stages": {}})
+        extractor.enable_profiling()
+        for url in self.urls:
+            self.assertEqual(extractor.extract(url), all_suffix.extract(url))
+        self.assertEqual(extractor("食狮.com.cn", format=True), all_suffix("食狮.com.cn", format=True))
+
+        report = extractor.profile_report(reset=True)
+        self.assertEqual(report["calls"], 7)
+        stages = report["stages"]
+        self.assertEqual(
+            list(stages),
+            ["input", "scheme", "userinfo", "host", "port_path", "ipv4", "split", "trie_walk",
+             "ipv6", "idna"],
+        )
+        self.assertEqual(stages["input"]["calls"], 7)
+        self.assertEqual(stages["host"]["calls"], 7)
+        self.assertEqual(stages["port_path"]["calls"], 1)
+        self.assertEqual(stages["ipv6"]["calls"], 1)  # "[::1" is rejected by the host scan
+        self.assertEqual(stages["idna"]["calls"], 1)
+        self.assertEqual(stages["ipv4"]["calls"], 5)
+        self.assertEqual(stages["trie_walk"]["calls"], 4)
+        self.assertEqual(sum(stage["total_ns"] for stage in stages.values()), report["total_ns"])
+        self.assertAlmostEqual(sum(stage["share"] for stage in stages.values()), 1.0)
+        self.assertEqual(extractor.profile_report()["calls"], 0)
+
+    def test_disable_profiling(self):
+        extractor = FastTLDExtract()
+        extractor.enable_profiling()
+        extractor.extract("www.google.com")
+        extractor.disable_profiling()
+        self.assertEqual(extractor.extract.__func__, FastTLDExtract.extract)
+        extractor.extract("www.google.com")
+        self.assertEqual(extractor.profile_report()["calls"], 1)
+
+    def test_profiled_parser_matches(self):
+        urls = [test.get("urlParams", {}).get("URL", "")
+                for name, tests in sorted(globals().items()) if name.endswith("Tests")
+                for test in tests] + self.urls
+        self.assertGreater(len(urls), 200)
+        for extractor in (all_suffix, no_private_suffix):
+            for url in urls:
+                netloc_with_scheme = memoryview(bytes(url.strip(whitespace), "utf-8"))
+                for subdomain, format, include_private in ((True, False, None),
+                                                           (False, True, None),
+                                                           (True, True, False)):
+                    ticks = []
+                    self.assertEqual(
+                        run_profiled(_extract_bytes_profiled, ticks, extractor,
+                                     netloc_with_scheme, subdomain, format,
+                                     include_private=include_private),
+                        extractor._extract_bytes(netloc_with_scheme, subdomain, format,
+                                                 include_private=include_private),
+                        url,
+                    )
+
+
+class SlowCallHookCase(unittest.TestCase):
+    def test_threshold(self):
+        extractor = FastTLDExtract()
+        calls = []
+        extractor.set_slow_call_hook(lambda *args: calls.append(args), threshold_ns=0)
+        self.assertEqual(extractor.extract("https://www.google.co.uk/x"),
+                         all_suffix.extract("https://www.google.co.uk/x"))
+        self.assertEqual(len(calls), 1)
+        raw_url, duration_ns, stages = calls[0]
+        self.assertEqual(raw_url, "https://www.google.co.uk/x")
+        self.assertGreater(duration_ns, 0)
+        self.assertEqual([stage for stage, _ in stages][0], "input")
+        self.assertEqual([stage for stage, _ in stages][-1], "trie_walk")
+
+        extractor.set_slow_call_hook(lambda *args: calls.append(args), threshold_ns=10 ** 12)
+        extractor.extract("www.google.com")
+        self.assertEqual(len(calls), 1)
+
+    def test_sample_every(self):
+        extractor = FastTLDExtract()
+        calls = []
+        extractor.set_slow_call_hook(lambda *args: calls.append(args), sample_every=3)
+        for _ in range(9):
+            extractor.extract("1.1.1.1")
+        self.assertEqual(len(calls), 3)
+        self.assertEqual([stage for stage, _ in calls[0][2]][-1], "ipv4")
+
+    def test_remove_hook(self):
+        extractor = FastTLDExtract()
+        calls = []
+        extractor.set_slow_call_hook(lambda *args: calls.append(args), threshold_ns=0)
+        extractor.set_slow_call_hook(None)
+        self.assertEqual(extractor.extract.__func__, FastTLDExtract.extract)
+        extractor.extract("www.google.com")
+        self.assertEqual(calls, [])
+
+    def test_invalid_arguments(self):
+        extractor = FastTLDExtract()
+        with self.assertRaises(Exception):
+            extractor.set_slow_call_hook(print)
+        with self.assertRaises(Exception):
+            extractor.set_slow_call_hook(print, sample_every=0)
+
+
+class RuleHitsCase(unittest.TestCase):
+    def test_rule_hits(self):
+        extractor = FastTLDExtract()
+        self.assertEqual(extractor.rule_hits(), {"rules": {}, "nodes": {}})
+        extractor.enable_rule_hits()
+        for url in ["google.com", "https://www.google.com/", "a.b.co.uk", "a.b\u3002co\uff0euk",
+                    "a.b.ck", "www.ck", "example.zzz", "1.1.1.1", "[::1]", "", "foo.blogspot.com"]:
+            self.assertEqual(extractor.extract(url), all_suffix.extract(url))
+        report = extractor.rule_hits(reset=True)
+        self.assertEqual(report["rules"], {"com": 2, "co.uk": 2, "*.ck": 1, "!www.ck": 1, "*": 1,
+                                           "blogspot.com": 1})
+        self.assertEqual(list(report["rules"])[:2], ["com", "co.uk"])
+        self.assertEqual(report["nodes"], {"com": 3, "uk": 2, "co.uk": 2, "ck": 2,
+                                           "blogspot.com": 1})
+        self.assertEqual(extractor.rule_hits(), {"rules": {}, "nodes": {}})
+
+    def test_disable_rule_hits(self):
+        extractor = FastTLDExtract()
+        extractor.enable_rule_hits()
+        extractor.disable_rule_hits()
+        self.assertEqual(extractor.extract.__func__, FastTLDExtract.extract)
+        extractor.extract("www.google.com")
+        self.assertEqual(extractor.rule_hits(), {"rules": {}, "nodes": {}})
+
+
+class MetricsCase(unittest.TestCase):
+    def test_stats(self):
+        extractor = FastTLDExtract()
+        extractor.enable_metrics()
+        urls = ["https://www.google.co.uk/x", "1.1.1.1", "[::1]", "ck", "a.noexist", "[::1", ""]
+        for url in urls:
+            self.assertEqual(extractor.extract(url), all_suffix.extract(url))
+        extractor("食狮.com.cn", format=True)
+        stats = extractor.stats()
+        latency = stats.pop("latency")
+        self.assertEqual(
+            stats,
+            {
+                "calls": 8,
+                "invalid": 2,
+                "rejected": 2,
+                "ipv4": 1,
+                "ipv6": 1,
+                "idn_conversions": 1,
+                "trie_constructions": 1,
+            },
+        )
+        self.assertEqual(latency["count"], 8)
+        self.assertEqual(latency["buckets"][-1], (float("inf"), 8))
+        counts = [count for _, count in latency["buckets"]]
+        self.assertEqual(counts, sorted(counts))
+
+        extractor.stats(reset=True)
+        self.assertEqual(extractor.stats()["calls"], 0)
+        extractor.disable_metrics()
+        self.assertEqual(extractor.extract.__func__, FastTLDExtract.extract)
+
+    def test_metrics_and_profiling(self):
+        extractor = FastTLDExtract()
+        extractor.enable_metrics()
+        extractor.enable_profiling()
+        extractor.extract("www.google.com")
+        extractor.disable_profiling()
+        extractor.extract("www.google.com")
+        self.assertEqual(extractor.stats()["calls"], 2)
+        self.assertEqual(extractor.profile_report()["calls"], 1)
+
+    def test_bulk_methods_not_instrumented(self):
+        extractor = FastTLDExtract()
+        extractor.enable_metrics()
+        extractor.enable_profiling()
+        extractor.enable_rule_hits()
+        extractor.extract_batch(["www.google.com", "a.b.co.uk"])
+        extractor.extract_batch(["www.google.com"], dedupe=True)
+        self.assertEqual(extractor.stats()["calls"], 0)
+        self.assertEqual(extractor.profile_report()["calls"], 0)
+        self.assertEqual(extractor.rule_hits()["rules"], {})
+
+    def test_prometheus_metrics(self):
+        extractor = FastTLDExtract()
+        self.assertIn("fasttld_extract_calls_total 0\n", extractor.prometheus_metrics())
+        extractor.enable_metrics()
+        extractor.extract("1.1.1.1")
+        text = extractor.prometheus_metrics(prefix="tld")
+        self.assertIn("# TYPE tld_extract_calls_total counter\ntld_extract_calls_total 1\n", text)
+        self.assertIn("tld_extract_ipv4_total 1\n", text)
+        self.assertIn("tld_trie_constructions_total 1\n", text)
+        self.assertIn("# TYPE tld_extract_latency_seconds histogram\n", text)
+        self.assertIn('tld_extract_latency_seconds_bucket{le="+Inf"} 1\n', text)
+        self.assertIn("tld_extract_latency_seconds_count 1\n", text)
+        self.assertTrue(text.endswith("\n"))
+
+
+class MemoryReportCase(unittest.TestCase):
+    def test_memory_report(self):
+        report = all_suffix.memory_report()
+        self.assertGreater(report["nodes"], 1)
+        self.assertGreater(report["leaves"], 1000)
+        self.assertGreater(report["keys"], report["leaves"])
+        self.assertLess(report["distinct_keys"], report["keys"])
+        self.assertEqual(
+            report["total_bytes"],
+            report["node_bytes"] + report["key_bytes"] + report["other_bytes"],
+        )
+        self.assertGreater(report["interning_savings_bytes"], 0)
+        self.assertLess(
+            no_private_suffix.memory_report()["total_bytes"], report["total_bytes"]
+        )
+
+    def test_interned_keys(self):
+        self.assertIs(
+            next(k for k in all_suffix.trie["uk"] if k == "co"),
+            next(k for k in all_suffix.trie["nz"] if k == "co"),
+        )
+
+
+class ExtractFileCase(unittest.TestCase):
+    def _write(self, content):
+        fd, path = tempfile.mkstemp(suffix=".txt")
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_extract_file(self):
+        lines = [
+            "https://maps.google.com.ua/a/long/path?query=42",
+            "  www.baidu.com.cn\r",
+            "",
+            "\u200b食狮.com.cn\u00a0",
+            "[aBcD:ef01:2345:6789:aBcD:ef01:2345:6789]:5432",
+            "1.1.1.1",
+            "食狮.com.cn",
+            " ",
+        ]
+        path = self._write("\n".join(lines).encode("utf-8"))
+        self.assertEqual(
+            list(all_suffix.extract_file(path)), [all_suffix.extract(line) for line in lines]
+        )
+        self.assertEqual(
+            list(no_private_suffix.extract_file(path, subdomain=False)),
+            [no_private_suffix.extract(line, subdomain=False) for line in lines],
+        )
+
+    def test_extract_file_trailing_newline(self):
+        path = self._write(b"jophy.com\nwww.ck\n")
+        self.assertEqual(
+            list(all_suffix.extract_file(path)),
+            [all_suffix.extract("jophy.com"), all_suffix.extract("www.ck")],
+        )
+
+    def test_extract_empty_file(self):
+        self.assertEqual(list(all_suffix.extract_file(self._write(b""))), [])
+
+    def test_extract_file_early_exit(self):
+        path = self._write(b"jophy.com\nwww.ck\n")
+        results = all_suffix.extract_file(path)
+        self.assertEqual(next(results), all_suffix.extract("jophy.com"))
+        results.close()
+
+    def test_extract_file_invalid_utf8(self):
+        path = self._write(b"a.com\nfoo.\xe9x.com\n\xe9\nb.com\n")
+        self.assertEqual(
+            list(all_suffix.extract_file(path)),
+            [all_suffix.extract("a.com"), all_suffix.extract(""), all_suffix.extract(""),
+             all_suffix.extract("b.com")],
+        )
+        results = all_suffix.extract_file(path, errors="strict")
+        self.assertEqual(next(results), all_suffix.extract("a.com"))
+        with self.assertRaisesRegex(Exception, "byte 6 .* not valid UTF-8"):
+            next(results)
+        with self.assertRaises(Exception):
+            all_suffix.extract_file(path, errors="replace")
+
+    def test_extract_file_error_not_masked(self):
+        path = self._write(b"a.com\n")
+        extractor = FastTLDExtract()
+
+        def fail(line, *args, **kwargs):
+            # The exception and its traceback hold a slice of the mapping
+            raise KeyError(line)
+
+        extractor._extract_bytes = fail
+        with self.assertRaises(KeyError):
+            list(extractor.extract_file(path))
+
+    def test_extract_file_include_private(self):
+        path = self._write(b"jophy.blogspot.com\n")
+        # Raised by the call itself, not on the first next()
+        with self.assertRaises(Exception):
+            no_private_suffix.extract_file(path, include_private=True)
+        self.assertEqual(
+            list(all_suffix.extract_file(path, include_private=False)),
+            [all_suffix.extract("jophy.blogspot.com", include_private=False)],
+        )
+
+
+@unittest.skipIf(pa is None, "pyarrow is not installed")
+class ExtractArrowCase(unittest.TestCase):
+    urls = [
+        "https://maps.google.com.ua/a/long/path?query=42",
+        None,
+        " 食狮.com.cn ",
+        "https://user@[aBcD:ef01:2345:6789:aBcD:ef01:2345:6789]:5432/path",
+        "",
+        "www.ck",
+    ]
+
+    def expected(self, urls, **kwargs):
+        return [
+            dict(all_suffix.extract(url, **kwargs)._asdict())
+            if url is not None
+            else dict((field, None) for field in TLDResult._fields)
+            for url in urls
+        ]
+
+    def test_extract_arrow(self):
+        table = all_suffix.extract_arrow(pa.array(self.urls), batch_size=4)
+        self.assertEqual(table.column_names, list(TLDResult._fields))
+        self.assertEqual(table.to_pylist(), self.expected(self.urls))
+        self.assertTrue(pa.types.is_dictionary(table.schema.field("suffix").type))
+        self.assertTrue(pa.types.is_dictionary(table.schema.field("scheme").type))
+        self.assertEqual(table.schema.field("domain").type, pa.string())
+
+    def test_extract_arrow_sliced_and_chunked(self):
+        array = pa.array(self.urls, type=pa.large_string())
+        self.assertEqual(
+            all_suffix.extract_arrow(array.slice(2, 3), subdomain=False).to_pylist(),
+            self.expected(self.urls[2:5], subdomain=False),
+        )
+        chunked = pa.chunked_array([array, array.slice(1)])
+        self.assertEqual(
+            all_suffix.extract_arrow(chunked).to_pylist(),
+            self.expected(self.urls + self.urls[1:]),
+        )
+
+    def test_extract_arrow_empty(self):
+        table = all_suffix.extract_arrow(pa.array([], type=pa.string()))
+        self.assertEqual(table.num_rows, 0)
+        self.assertEqual(table.column_names, list(TLDResult._fields))
+
+
+@unittest.skipIf(pa is None, "pyarrow is not installed")
+class ParquetTransformCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmpdir, "in.parquet")
+        self.destination = os.path.join(self.tmpdir, "out.parquet")
+
+    def tearDown(self):
+        for name in os.listdir(self.tmpdir):
+            os.remove(os.path.join(self.tmpdir, name))
+        os.rmdir(self.tmpdir)
+
+    def test_transform_parquet(self):
+        urls = ["https://www.google.com/a", "news.blogspot.co.uk", None, "1.1.1.1"] * 5
+        pq.write_table(pa.table({"id": list(range(20)), "url": urls}), self.source,
+                       row_group_size=3)
+        for max_workers in (1, 2):
+            self.assertEqual(
+                transform_parquet(self.source, self.destination, "url", max_workers=max_workers), 7
+            )
+            output = pq.ParquetFile(self.destination)
+            self.assertEqual(output.num_row_groups, 7)
+            table = output.read()
+            self.assertEqual(table.column_names, ["id", "url", "url_domain_name", "url_suffix"])
+            self.assertEqual(table.column("id").to_pylist(), list(range(20)))
+            for url, domain_name, suffix in zip(
+                urls,
+                table.column("url_domain_name").to_pylist(),
+                table.column("url_suffix").to_pylist(),
+            ):
+                if url is None:
+                    self.assertEqual((domain_name, suffix), (None, None))
+                else:
+                    res = all_suffix.extract(url)
+                    self.assertEqual((domain_name, suffix), (res.domain_name, res.suffix))
+
+    def test_transform_parquet_options(self):
+        pq.write_table(pa.table({"url": ["news.blogspot.co.uk"]}), self.source)
+        transform_parquet(
+            self.source,
+            self.destination,
+            "url",
+            fields=("subdomain", "domain"),
+            prefix="",
+            exclude_private_suffix=True,
+        )
+        self.assertEqual(
+            pq.read_table(self.destination).to_pylist(),
+            [{"url": "news.blogspot.co.uk", "subdomain": "news", "domain": "blogspot"}],
+        )
+        with self.assertRaises(Exception):
+            transform_parquet(self.source, self.destination, "url", fields=("url",), prefix="")
+
+    def test_transform_parquet_empty(self):
+        pq.ParquetWriter(self.source, pa.schema([("url", pa.string())])).close()
+        self.assertEqual(transform_parquet(self.source, self.destination, "url"), 0)
+        table = pq.read_table(self.destination)
+        self.assertEqual(table.num_rows, 0)
+        self.assertEqual(table.column_names, ["url", "url_domain_name", "url_suffix"])
+
+
+@unittest.skipIf(pd is None, "pandas is not installed")
+class PandasAccessorCase(unittest.TestCase):
+    def test_extract(self):
+        urls = ["www.google.com", None, "https://a.b.co.uk:80", "www.google.com", "1.1.1.1"]
+        series = pd.Series(urls, index=[10, 11, 12, 13, 14], name="url")
+        frame = series.tld.extract(extractor=no_private_suffix, subdomain=False)
+        self.assertEqual(list(frame.columns), list(TLDResult._fields))
+        self.assertEqual(list(frame.index), [10, 11, 12, 13, 14])
+        for url, row in zip(urls, frame.itertuples(index=False)):
+            if url is None:
+                self.assertTrue(all(pd.isna(value) for value in row))
+            else:
+                self.assertEqual(tuple(row), no_private_suffix.extract(url, subdomain=False))
+
+    def test_extract_default_extractor(self):
+        frame = pd.DataFrame({"url": ["news.blogspot.co.uk"]}).url.tld.extract()
+        self.assertEqual(frame.loc[0, "suffix"], "blogspot.co.uk")
+
+    def test_extract_empty(self):
+        frame = pd.Series([], dtype=object).tld.extract()
+        self.assertEqual(len(frame), 0)
+        self.assertEqual(list(frame.columns), list(TLDResult._fields))
+
+
 if __name__ == "__main__":
     unittest.main()